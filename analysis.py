@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from optparse import OptionParser
+from itertools import islice
+import multiprocessing
+import json
+import os
+import re
+import sys
+import numpy
+import logreader
+from errors import SimulationError
+from log import Log
+
+# simulation parameters encoded in output file names, separated by _
+PARAMS = ["lambda", "seed", "slots", "nodes"]
+# metrics computed for each run
+METRICS = ["dr", "cr", "th", "sz"]
+# parameters runs are aggregated by
+GROUP_BY = ["lambda", "slots", "nodes"]
+# extensions of the output files of the simulator
+EXTENSIONS = re.compile(r"\.(csv|bin|bin\.gz|json)$")
+# extensions of the outputs of a run, in order of preference when a run has
+# more than one. the .json summary is only used when no trace was logged
+PREFERRED_EXTENSIONS = [".csv", ".bin", ".bin.gz", ".json"]
+# files written next to the outputs that are not outputs of a run: profiling
+# reports, checkpoints, warm-ups shared by replications (see main.py -n),
+# results of replicate.py and of this script
+EXCLUDED = re.compile(r"(\.profile\.json|\.ckpt|\.ckpt\.tmp)$|"
+                      r"_warmup\.(csv|bin|bin\.gz|json)$|"
+                      r"^(replications\.json|res\.csv|stats.*)$")
+# number of lines parsed at once from csv files
+CSV_CHUNK_LINES = 262144
+# number of record types that can be counted
+RECORD_TYPES = 256
+
+
+def get_params(file_name):
+    """
+    Extracts the values of the simulation parameters from the name of an
+    output file, as process.R does
+    :param file_name: name of the output file
+    :returns: dictionary mapping parameter names to values. values made of
+    digits only are converted to numbers
+    """
+    fields = EXTENSIONS.sub("", os.path.basename(file_name)).split("_")
+    params = {}
+    for i, name in enumerate(PARAMS):
+        value = fields[i] if i < len(fields) else None
+        if value is not None and value.isdigit():
+            value = float(value)
+        params[name] = value
+    return params
+
+
+def iter_csv_chunks(file_name):
+    """
+    Iterates over the records of a csv output file in chunks
+    :param file_name: name of the output file
+    :returns: a generator of dictionaries mapping column names to numpy arrays
+    """
+    with open(file_name) as f:
+        f.readline()
+        while True:
+            lines = list(islice(f, CSV_CHUNK_LINES))
+            if len(lines) == 0:
+                break
+            values = numpy.fromstring("".join(lines).replace("\n", ","),
+                                      sep=",").reshape(-1, 5)
+            yield {"time": values[:, 0],
+                   "event": values[:, 3].astype(numpy.int64),
+                   "size": values[:, 4]}
+
+
+def divide(a, b):
+    """
+    Divides two numbers returning inf or nan for a zero divisor, as R does
+    """
+    if b == 0:
+        return float("nan") if a == 0 else float("inf")
+    return float(a) / b
+
+
+def compute_metrics(file_name):
+    """
+    Computes delivery rate, collision rate, throughput and mean packet size of
+    a run in a single pass over its output file, with the same definitions
+    used by process.R. Summaries written by the simulator are read directly
+    :param file_name: name of the output file
+    :returns: dictionary with the parameters and the metrics of the run
+    """
+    stats = get_params(file_name)
+    if file_name.endswith(".json"):
+        with open(file_name) as f:
+            summary = json.load(f)
+        for metric in METRICS:
+            stats[metric] = summary[metric]
+        return stats
+
+    if file_name.endswith(".csv"):
+        chunks = iter_csv_chunks(file_name)
+    else:
+        chunks = logreader.iter_chunks(file_name)
+    counts = numpy.zeros(RECORD_TYPES, dtype=numpy.int64)
+    sizes = numpy.zeros(RECORD_TYPES)
+    max_time = float("-inf")
+    for chunk in chunks:
+        if len(chunk["time"]) == 0:
+            continue
+        event = chunk["event"].astype(numpy.int64)
+        counts += numpy.bincount(event, minlength=RECORD_TYPES)
+        sizes += numpy.bincount(event, weights=chunk["size"],
+                                minlength=RECORD_TYPES)
+        max_time = max(max_time, float(chunk["time"].max()))
+
+    received = int(counts[Log.LOG_RECEIVED])
+    corrupted = int(counts[Log.LOG_CORRUPTED])
+    generated = int(counts[Log.LOG_GENERATED])
+    nodes = stats["nodes"]
+    stats["dr"] = divide(received, generated * (nodes - 1))
+    if received + corrupted == 0:
+        stats["cr"] = 0.0
+    else:
+        stats["cr"] = divide(corrupted, received + corrupted)
+    stats["th"] = divide(sizes[Log.LOG_RECEIVED], max_time)
+    stats["sz"] = divide(sizes[Log.LOG_GENERATED], generated)
+    return stats
+
+
+def aggregate(runs):
+    """
+    Averages the metrics of the runs with the same lambda, slots and number of
+    nodes, i.e., over the seeds, as interpolate.R does
+    :param runs: list of dictionaries returned by compute_metrics()
+    :returns: list of dictionaries with the aggregated values, ordered by
+    nodes, slots and lambda
+    """
+    groups = {}
+    for run in runs:
+        key = tuple(run[p] for p in GROUP_BY)
+        if None in key:
+            continue
+        groups.setdefault(key, []).append(run)
+    table = []
+    for key in sorted(groups, key=lambda k: k[::-1]):
+        row = dict(zip(GROUP_BY, key))
+        for metric in METRICS:
+            row[metric] = float(numpy.mean([r[metric] for r in groups[key]]))
+        table.append(row)
+    return table
+
+
+def format_value(value):
+    """
+    Formats a value for the output csv files, keeping full precision
+    """
+    if isinstance(value, float):
+        if value.is_integer():
+            return "%d" % value
+        return repr(value)
+    if value is None:
+        return "NA"
+    return str(value)
+
+
+def save_table(file_name, columns, rows):
+    """
+    Saves a list of dictionaries as a csv file
+    :param file_name: name of the output file
+    :param columns: columns to save
+    :param rows: list of dictionaries
+    """
+    with open(file_name, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for row in rows:
+            f.write(",".join(format_value(row[c]) for c in columns) + "\n")
+
+
+def get_extension(file_name):
+    """
+    Returns the extension of an output file, among EXTENSIONS
+    """
+    return EXTENSIONS.search(file_name).group(0)
+
+
+def find_output_files(folder):
+    """
+    Lists the output files of the simulator in a folder, one per run. Runs
+    are identified by the file name without extension: when a run has both a
+    trace and a .json summary, only the trace is used
+    :param folder: the folder
+    :returns: sorted list of file names
+    """
+    runs = {}
+    for f in os.listdir(folder):
+        if not EXTENSIONS.search(f) or EXCLUDED.search(f):
+            continue
+        runs.setdefault(EXTENSIONS.sub("", f), []).append(f)
+    files = []
+    for names in runs.values():
+        names.sort(key=lambda f: PREFERRED_EXTENSIONS.index(get_extension(f)))
+        files.append(os.path.join(folder, names[0]))
+    return sorted(files)
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options] resultsDir outDir",
+                          description="Computes the metrics of all the "
+                                      "simulation outputs in a folder and "
+                                      "aggregates them over the seeds, saving "
+                                      "stats.csv and res.csv in the output "
+                                      "folder")
+    parser.add_option("-j", "--jobs", dest="jobs",
+                      default=multiprocessing.cpu_count(), action="store",
+                      type="int",
+                      help="number of parallel processes [default: %default]")
+    (options, args) = parser.parse_args()
+
+    if len(args) != 2:
+        print(parser.get_usage())
+        sys.exit(1)
+    res_folder = args[0]
+    out_folder = args[1]
+
+    files = find_output_files(res_folder)
+    if len(files) == 0:
+        sys.stderr.write("Error: no simulation output in %s\n" % res_folder)
+        sys.exit(1)
+    print("Computing metrics for %d simulations ..." % len(files))
+    if options.jobs > 1:
+        pool = multiprocessing.Pool(options.jobs)
+        runs = pool.map(compute_metrics, files, chunksize=1)
+        pool.close()
+        pool.join()
+    else:
+        runs = [compute_metrics(f) for f in files]
+
+    stats_file = os.path.join(out_folder, "stats.csv")
+    save_table(stats_file, PARAMS + METRICS, runs)
+    res_file = os.path.join(out_folder, "res.csv")
+    save_table(res_file, GROUP_BY + METRICS, aggregate(runs))
+    print("Results saved in %s" % res_file)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
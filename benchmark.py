@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from optparse import OptionParser
+import json
+import math
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import sim
+from config import Config
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# node counts of the synthetic topologies
+NODES = [10, 100, 1000, 10000]
+# mean number of neighbors of a node in sparse and dense topologies
+DENSITIES = {"sparse": 4, "dense": 20}
+# minimum mean number of packets generated by each node
+MIN_PACKETS = 2
+# metrics of a benchmark, with True if higher values are better
+METRICS = [("events_per_second", True), ("sim_per_wall", True),
+           ("peak_rss", False)]
+# metrics computed from the time of the main loop, as a function of the
+# results of a benchmark and of the time
+TIMED_METRICS = {
+    "events_per_second": lambda r, t: r["events"] / t,
+    "sim_per_wall": lambda r, t: r["sim_time"] / t
+}
+
+
+def generate_topology(nodes, degree, comm_range, seed):
+    """
+    Places nodes uniformly at random in a square, sized so that each node has
+    on average the given number of neighbors within communication range
+    (ignoring border effects)
+    :param nodes: number of nodes
+    :param degree: mean number of neighbors
+    :param comm_range: communication range in meters
+    :param seed: seed of the PRNG placing the nodes
+    :returns: list of [x, y] pairs
+    """
+    side = comm_range * math.sqrt(math.pi * nodes / float(degree))
+    rng = random.Random(seed)
+    return [[rng.uniform(0, side), rng.uniform(0, side)]
+            for i in range(nodes)]
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size of the process in MB, or None if it
+    cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return rss / 1048576.0
+    return rss / 1024.0
+
+
+def measure_run(config_file, section, run, params, repeat, min_time):
+    """
+    Measures a run of a config file section in this process. The run is
+    simulated repeat times, and each measurement simulates it again until
+    at least min_time seconds have been spent in the main loop, so that
+    short runs are not timed on a single execution. Runs are deterministic,
+    so all executions handle the same events, and the fastest measurement is
+    the one least disturbed by the rest of the system
+    :param config_file: the config file
+    :param section: section of the config file
+    :param run: run number
+    :param params: dictionary of parameters replacing the ones of the section
+    :param repeat: number of measurements
+    :param min_time: minimum wall-clock duration of a measurement in seconds
+    :returns: dictionary with the number of events handled, the time spent
+    initializing the run, the best time spent in the main loop, the time of
+    each measurement and the simulated time
+    """
+    out_dir = tempfile.mkdtemp()
+    simulator = sim.Sim.Instance()
+    simulator.set_config(config_file, section, out_dir)
+    config = simulator.config
+    config.cfg[section].update(params)
+    config.map_parameters()
+    init_time = None
+    times = []
+    for i in range(repeat):
+        executions = 0
+        elapsed = 0.0
+        while executions == 0 or elapsed < min_time:
+            start = time.time()
+            simulator.initialize(run)
+            if init_time is None:
+                init_time = time.time() - start
+            start = time.time()
+            simulator.run()
+            elapsed = elapsed + time.time() - start
+            executions = executions + 1
+        times.append(elapsed / executions)
+    shutil.rmtree(out_dir)
+    return {"events": simulator.handled_events, "init_time": init_time,
+            "time": min(times), "times": times,
+            "sim_time": simulator.get_time()}
+
+
+def run_in_child(args):
+    """
+    Executes the running script again in a fresh interpreter with the --child
+    option, as the simulator is a singleton and the peak memory must only
+    account for the benchmarked run. The child prints its results as JSON on
+    the last line of its output
+    :param args: arguments passed to the child after --child
+    :returns: the results of the child
+    """
+    output = subprocess.check_output([sys.executable, sys.argv[0],
+                                      "--child"] + args)
+    return json.loads(output.decode().strip().split("\n")[-1])
+
+
+def run_child(options):
+    """
+    Measures a simulation on a synthetic topology and prints the results as
+    JSON. Nothing is logged, so that the kernel is measured rather than the
+    disk
+    """
+    simulator = sim.Sim.Instance()
+    cfg = Config(options.config, options.section,
+                 tempfile.gettempdir()).cfg[options.section]
+    params = {
+        simulator.PAR_SEED: options.seed,
+        simulator.PAR_DURATION: options.duration,
+        "interarrival": {"distribution": "exp", "lambda": options.load},
+        "maxslots": options.slots,
+        simulator.PAR_NODES: [generate_topology(options.nodes,
+                                                DENSITIES[options.density],
+                                                cfg["range"], options.seed)],
+        simulator.PAR_LOG_FORMAT: "none",
+        simulator.PAR_METRICS: True,
+        Config.OUTPUT: "benchmark.csv"
+    }
+    r = measure_run(options.config, options.section, 0, params,
+                    options.repeat, options.min_time)
+    r["peak_rss"] = get_peak_rss()
+    print(json.dumps(r))
+
+
+def benchmark(options, nodes, density, load, slots):
+    """
+    Benchmarks a synthetic scenario in a child process
+    :returns: dictionary describing the scenario, with its measurements
+    """
+    # limit the duration so that about the same number of packets is
+    # generated in all scenarios, but let each node generate a few packets,
+    # so that large topologies are not measured only on their first events
+    duration = min(options.duration,
+                   max(options.packets / float(nodes * load),
+                       MIN_PACKETS / float(load)))
+    r = run_in_child(["-c", options.config, "-s", options.section,
+                      "--nodes", str(nodes), "--density", density,
+                      "--load", str(load), "--slots", str(slots),
+                      "--duration", str(duration), "--seed", str(options.seed),
+                      "--repeat", str(options.repeat),
+                      "--min-time", str(options.min_time)])
+    r.update({
+        "name": "nodes=%d %s lambda=%s maxslots=%s" %
+                (nodes, density, load, slots),
+        "nodes": nodes,
+        "density": density,
+        "lambda": load,
+        "maxslots": slots,
+        "events_per_second": TIMED_METRICS["events_per_second"](r, r["time"]),
+        "sim_per_wall": TIMED_METRICS["sim_per_wall"](r, r["time"])
+    })
+    return r
+
+
+def get_grid(config_file, section, full):
+    """
+    Gets the values of lambda and maxslots to benchmark from a section of
+    the config file
+    :param full: if False, only the lowest, middle and highest lambda and the
+    lowest and highest maxslots are used
+    :returns: pair with the list of lambdas and the list of maxslots
+    """
+    cfg = Config(config_file, section, tempfile.gettempdir()).cfg[section]
+    interarrival = cfg["interarrival"]
+    if not isinstance(interarrival, list):
+        interarrival = [interarrival]
+    loads = sorted(set(i["lambda"] for i in interarrival))
+    slots = cfg["maxslots"]
+    if not isinstance(slots, list):
+        slots = [slots]
+    slots = sorted(set(slots))
+    if not full:
+        loads = sorted(set([loads[0], loads[len(loads) // 2], loads[-1]]))
+        slots = sorted(set([slots[0], slots[-1]]))
+    return (loads, slots)
+
+
+def run_suite(options):
+    """
+    Runs all the benchmarks and saves the results
+    """
+    nodes = NODES
+    if options.nodes_list != "":
+        nodes = [int(n) for n in options.nodes_list.split(",")]
+    (loads, slots) = get_grid(options.config, options.section, options.full)
+    results = []
+    for n in nodes:
+        for density in sorted(DENSITIES):
+            for load in loads:
+                for s in slots:
+                    r = benchmark(options, n, density, load, s)
+                    results.append(r)
+                    print("%-44s %9d events %8.3f s %10.0f events/s "
+                          "%8.3f sim/wall %7.1f MB" %
+                          (r["name"], r["events"], r["time"],
+                           r["events_per_second"], r["sim_per_wall"],
+                           r["peak_rss"] or 0))
+    with open(options.output, "w") as f:
+        json.dump({"python": platform.python_version(),
+                   "machine": platform.machine(),
+                   "packets": options.packets,
+                   "repeat": options.repeat,
+                   "min_time": options.min_time,
+                   "results": results}, f, indent=4, sort_keys=True)
+    print("Results saved in %s" % options.output)
+
+
+def is_noise(metric, baseline, result, higher_is_better):
+    """
+    Tells whether the change of a metric measured on the main loop is within
+    the noise of the measurements, i.e., whether some measurement of the
+    result is as good as some measurement of the baseline
+    :param metric: name of the metric
+    :param baseline: results of the benchmark in the baseline
+    :param result: results of the benchmark
+    :param higher_is_better: whether higher values of the metric are better
+    """
+    if metric not in TIMED_METRICS or "times" not in baseline or \
+       "times" not in result:
+        return False
+    f = TIMED_METRICS[metric]
+    b = [f(baseline, t) for t in baseline["times"]]
+    r = [f(result, t) for t in result["times"]]
+    if higher_is_better:
+        return max(r) >= min(b)
+    return min(r) <= max(b)
+
+
+def compare(baseline_file, results_file, threshold):
+    """
+    Compares benchmark results with a baseline, flagging the metrics that got
+    worse by more than the threshold. Changes of the metrics measured on the
+    main loop are not flagged if they are within the spread of the
+    measurements
+    :param threshold: tolerated relative change, e.g., 0.1 for 10%
+    :returns: the number of regressions
+    """
+    with open(baseline_file) as f:
+        baseline = dict((r["name"], r) for r in json.load(f)["results"])
+    with open(results_file) as f:
+        results = json.load(f)["results"]
+    regressions = 0
+    for r in results:
+        if r["name"] not in baseline:
+            print("%-44s not in baseline" % r["name"])
+            continue
+        b = baseline[r["name"]]
+        for (metric, higher_is_better) in METRICS:
+            if r.get(metric) is None or not b.get(metric):
+                continue
+            change = (r[metric] - b[metric]) / float(b[metric])
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                if is_noise(metric, b, r, higher_is_better):
+                    flag = "noise"
+                else:
+                    flag = "REGRESSION"
+                    regressions = regressions + 1
+            print("%-44s %-18s %12.1f -> %12.1f %+7.1f%% %s" %
+                  (r["name"], metric, b[metric], r[metric], 100 * change,
+                   flag))
+    print("%d regressions" % regressions)
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options] run\n"
+                                "       %prog [options] compare baseline.json "
+                                "results.json",
+                          description="Measures events per second, simulated "
+                                      "seconds per wall-clock second and peak "
+                                      "memory of the simulator on synthetic "
+                                      "topologies, or compares the results "
+                                      "with a baseline")
+    parser.add_option("-c", "--config", dest="config", default="config.json",
+                      action="store",
+                      help="config file providing the parameters of the "
+                           "nodes and the grid of lambda and maxslots "
+                           "[default: %default]")
+    parser.add_option("-s", "--section", dest="section", default="complete",
+                      action="store",
+                      help="section inside configuration file "
+                           "[default: %default]")
+    parser.add_option("-o", "--output", dest="output",
+                      default="benchmark.json", action="store",
+                      help="file the results are saved to "
+                           "[default: %default]")
+    parser.add_option("-n", "--nodes-list", dest="nodes_list", default="",
+                      action="store",
+                      help="comma separated node counts [default: %s]" %
+                           ",".join(str(n) for n in NODES))
+    parser.add_option("-f", "--full", dest="full", default=False,
+                      action="store_true",
+                      help="use all the values of lambda and maxslots in the "
+                           "section, instead of the extremes and the middle")
+    parser.add_option("-p", "--packets", dest="packets", default=2000,
+                      action="store", type="int",
+                      help="packets generated per benchmark, which limits "
+                           "the simulated time. each node generates at least "
+                           "%d packets on average [default: %%default]" %
+                           MIN_PACKETS)
+    parser.add_option("-R", "--repeat", dest="repeat", default=10,
+                      action="store", type="int",
+                      help="measurements per benchmark, the best of which is "
+                           "reported [default: %default]")
+    parser.add_option("-m", "--min-time", dest="min_time", default=0.1,
+                      action="store", type="float",
+                      help="minimum wall-clock seconds of a measurement. "
+                           "shorter runs are executed several times "
+                           "[default: %default]")
+    parser.add_option("-t", "--threshold", dest="threshold", default=0.1,
+                      action="store", type="float",
+                      help="relative change flagged as a regression by "
+                           "compare [default: %default]")
+    # options used internally to benchmark a single run in a child process
+    parser.add_option("--child", dest="child", default=False,
+                      action="store_true", help="internal use")
+    parser.add_option("--nodes", dest="nodes", default=0, action="store",
+                      type="int", help="internal use")
+    parser.add_option("--density", dest="density", default="sparse",
+                      action="store", help="internal use")
+    parser.add_option("--load", dest="load", default=10, action="store",
+                      type="float", help="internal use")
+    parser.add_option("--slots", dest="slots", default=0, action="store",
+                      type="int", help="internal use")
+    parser.add_option("--duration", dest="duration", default=10,
+                      action="store", type="float",
+                      help="maximum simulated seconds per benchmark "
+                           "[default: %default]")
+    parser.add_option("--seed", dest="seed", default=0, action="store",
+                      type="int",
+                      help="seed of the topologies and of the runs "
+                           "[default: %default]")
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return
+
+    if len(args) == 1 and args[0] == "run":
+        run_suite(options)
+    elif len(args) == 3 and args[0] == "compare":
+        if compare(args[1], args[2], options.threshold) > 0:
+            sys.exit(1)
+    else:
+        print(parser.get_usage())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except sim.SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
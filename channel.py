@@ -14,10 +14,10 @@
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
 import math
-import copy
+from array import array
 from module import Module
-from event import Event
 from events import Events
+from packet import Reception
 
 
 class Channel(Module):
@@ -32,6 +32,9 @@ class Channel(Module):
     PAR_RANGE = "range"
     # speed of light in m/s, used to compute propagation delay
     SOL = 299792458.0
+    # size of the occupancy list of a node above which frames that are over
+    # are removed when adding a new one
+    PRUNE_SIZE = 16
 
     def __init__(self, config):
         """
@@ -46,19 +49,152 @@ class Channel(Module):
         self.range = config.get_param(self.PAR_RANGE)
         # list of all communication nodes in the simulation
         self.nodes = []
-        # map of neighbors that maps each node id to the list of its neighbors
+        # map of neighbors that maps each node id to the list of its neighbors,
+        # used while registering nodes. once all nodes are registered, it is
+        # compacted into the adjacency arrays below
         self.neighbors = {}
+        # neighbor graph in compressed sparse row format: the neighbors of the
+        # node at position i in self.nodes are the nodes at positions
+        # adjacency[offsets[i]:offsets[i + 1]], and delays holds the
+        # propagation delay of each of these links. None until computed
+        self.offsets = None
+        self.adjacency = None
+        self.delays = None
+        # index of the frames on the air at each node: for the node at
+        # position i in self.nodes, lists the frames reaching it that have not
+        # ended yet, as of the last time the list was pruned. each frame is a
+        # (start, end) pair, where start and end are the (time, sequence
+        # number) keys that the START_RX and END_RX events for the node would
+        # have in the queue of events. nodes are therefore only notified about
+        # frames they need to react to, and can check the channel state on
+        # demand
+        self.occupancy = []
+        # spatial index of the nodes: the plane is divided in square cells of
+        # side equal to the communication range, so that the neighbors of a
+        # node can only be found in its own cell or in the eight surrounding
+        # ones. maps the (x, y) coordinates of a cell to the list of nodes
+        # inside it, in registration order
+        self.grid = {}
+        # map from node id to the position of the node in self.nodes
+        self.index = {}
 
     def register_node(self, node):
         """
         Registers a node participating to the simulation. This way the channel
         knows who is participating and can notify them when transmissions start
-        or end
+        or end. Use register_nodes() to register many nodes at once
         :param node: the node to register, an instance of the Node class
         """
+        self.expand_adjacency()
+        self.index[node.get_id()] = len(self.nodes)
         self.nodes.append(node)
+        self.occupancy.append([])
         # recompute the neighbors of all nodes considering the new node as well
         self.recompute_neighbors(node)
+        self.grid.setdefault(self.get_cell(node), []).append(node)
+
+    def register_nodes(self, nodes):
+        """
+        Registers a list of nodes at once, computing their neighbors in time
+        linear in the number of nodes (as long as the density of nodes is
+        bounded). The resulting neighbor lists are the same that would be
+        obtained by registering the nodes one by one with register_node()
+        :param nodes: list of nodes to register, instances of the Node class
+        """
+        self.expand_adjacency()
+        index = self.index
+        for node in nodes:
+            index[node.get_id()] = len(self.nodes)
+            self.nodes.append(node)
+            self.occupancy.append([])
+            self.neighbors[node.get_id()] = []
+            self.grid.setdefault(self.get_cell(node), []).append(node)
+        for node in nodes:
+            node_index = index[node.get_id()]
+            # nodes registered before this one have already added themselves
+            # to its list of neighbors, in registration order. here we look
+            # for the neighbors registered after it
+            later = []
+            for n in self.get_candidates(node):
+                if index[n.get_id()] > node_index and \
+                   self.distance(n, node) < self.range:
+                    later.append(n)
+            later.sort(key=lambda n: index[n.get_id()])
+            for n in later:
+                self.neighbors[n.get_id()].append(node)
+            self.neighbors[node.get_id()].extend(later)
+        self.compact_adjacency()
+
+    def compact_adjacency(self):
+        """
+        Converts the map of neighbors into the adjacency arrays, computing the
+        propagation delay of each link once and for all
+        """
+        self.offsets = array('l', [0])
+        self.adjacency = array('i')
+        self.delays = array('d')
+        for node in self.nodes:
+            neighbors = self.neighbors[node.get_id()]
+            # compute propagation delay: distance / speed of light
+            delays = [self.distance(node, n) / Channel.SOL for n in neighbors]
+            # store neighbors by increasing propagation delay, which is the
+            # order in which they receive a transmission. the sort is stable,
+            # so neighbors at the same distance keep their registration order
+            for k in sorted(range(len(neighbors)), key=lambda k: delays[k]):
+                self.adjacency.append(self.index[neighbors[k].get_id()])
+                self.delays.append(delays[k])
+            self.offsets.append(len(self.adjacency))
+        self.neighbors = None
+
+    def expand_adjacency(self):
+        """
+        Converts the adjacency arrays back into the map of neighbors, so that
+        new nodes can be added to it
+        """
+        if self.offsets is None:
+            return
+        self.neighbors = {}
+        for node in self.nodes:
+            self.neighbors[node.get_id()] = self.get_neighbors(node)
+        self.offsets = None
+        self.adjacency = None
+        self.delays = None
+
+    def get_neighbors(self, node):
+        """
+        Returns the neighbors of a node
+        :param node: the node
+        :returns: list of nodes within communication range of node
+        """
+        if self.offsets is None:
+            return list(self.neighbors[node.get_id()])
+        i = self.index[node.get_id()]
+        return [self.nodes[j] for j in
+                self.adjacency[self.offsets[i]:self.offsets[i + 1]]]
+
+    def get_cell(self, node):
+        """
+        Returns the coordinates of the cell of the spatial index including a
+        node
+        :param node: the node
+        :returns: (x, y) pair of cell coordinates
+        """
+        return (int(math.floor(node.get_posx() / float(self.range))),
+                int(math.floor(node.get_posy() / float(self.range))))
+
+    def get_candidates(self, node):
+        """
+        Returns the nodes in the cell of the given node and in the surrounding
+        ones, i.e., all the nodes that might be within communication range
+        :param node: the node
+        :returns: list of candidate neighbors, possibly including node itself
+        """
+        x, y = self.get_cell(node)
+        candidates = []
+        for cx in (x - 1, x, x + 1):
+            for cy in (y - 1, y, y + 1):
+                candidates.extend(self.grid.get((cx, cy), ()))
+        return candidates
 
     def distance(self, a, b):
         """
@@ -77,7 +213,11 @@ class Channel(Module):
         """
         # neighbors for the newest node
         new_node_neighbors = []
-        for n in self.nodes:
+        # only the nodes in the surrounding cells can be within range. sort
+        # them by registration order, which is the order in which they appear
+        # in self.nodes
+        for n in sorted(self.get_candidates(new_node),
+                        key=lambda n: self.index[n.get_id()]):
             # if the node n is within communication range of the newest node
             if n.get_id() != new_node.get_id() and \
                self.distance(n, new_node) < self.range:
@@ -87,33 +227,160 @@ class Channel(Module):
         # save neighbors for the new node in the map
         self.neighbors[new_node.get_id()] = new_node_neighbors
 
+    def count_transmissions(self, node):
+        """
+        Returns the number of frames currently on the air at a node, i.e., the
+        frames whose START_RX event at the node would have been processed
+        already (or is being processed) and whose END_RX event would not
+        :param node: the node
+        :returns: the number of frames the node can sense
+        """
+        key = self.sim.get_event_key()
+        frames = self.occupancy[self.index[node.get_id()]]
+        self.prune(frames, key)
+        count = 0
+        for frame in frames:
+            if frame[0] <= key:
+                count = count + 1
+        return count
+
+    def prune(self, frames, key):
+        """
+        Removes the frames that are over from an occupancy list
+        :param frames: the list of frames at a node
+        :param key: (time, sequence number) key of the current event
+        """
+        frames[:] = [f for f in frames if f[1] > key]
+
     def start_transmission(self, source_node, packet=None):
         """
         Begins transmission of a frame on the channel, notifying all neighbors
-        about such event
+        about such event. Instead of scheduling a START_RX and an END_RX event
+        per neighbor, a single Broadcast is scheduled for the beginning of the
+        frame at all neighbors and one for its end, which the simulator
+        expands into per-neighbor events as they become due
         :param source_node: node that starts the transmission
         :param packet: packet being transmitted
         """
-        for neighbor in self.neighbors[source_node.get_id()]:
-            # compute propagation delay: distance / speed of light
-            propagation_delay = self.distance(source_node, neighbor) /\
-                                Channel.SOL
-
-            start_time = self.sim.get_time() + propagation_delay
-
-            # generate and schedule START_RX event at receiver
-            # be sure to make a copy of the packet and not pass the same
-            # reference to multiple nodes, as they will process the packet in
-            # different ways. one node might be able to receive it, one node
-            # might not
-            nodePacket = copy.deepcopy(packet)
-            start_rx = Event(start_time,
-                             Events.START_RX, neighbor, source_node,
-                             nodePacket)
-            self.sim.schedule_event(start_rx)
-
-            # also schedule the event to handle the end of this frame
-            end_rx = Event(start_time + nodePacket.get_duration(),
-                           Events.END_RX, neighbor, source_node,
-                           nodePacket)
-            self.sim.schedule_event(end_rx)
+        if self.offsets is None:
+            self.compact_adjacency()
+        i = self.index[source_node.get_id()]
+        first = self.offsets[i]
+        last = self.offsets[i + 1]
+        if first == last:
+            return
+        # reserve the sequence numbers the START_RX and END_RX events would
+        # get if they were scheduled one by one, alternating the two for each
+        # neighbor, so that ties with other events are broken the same way
+        sequence = self.sim.reserve_sequence(2 * (last - first))
+        # add the frame to the channel occupancy at each neighbor
+        now = self.sim.get_time()
+        key = self.sim.get_event_key()
+        duration = packet.get_duration()
+        adjacency = self.adjacency
+        delays = self.delays
+        occupancy = self.occupancy
+        for k in range(first, last):
+            start = now + delays[k]
+            seq = sequence + 2 * (k - first)
+            frames = occupancy[adjacency[k]]
+            if len(frames) >= self.PRUNE_SIZE:
+                self.prune(frames, key)
+            frames.append(((start, seq), (start + duration, seq + 1)))
+        # reception records, shared by the START_RX and END_RX events of each
+        # neighbor. they are created when the frame reaches the neighbor
+        receptions = [None] * (last - first)
+        start_rx = Broadcast(self, Events.START_RX, source_node, packet,
+                             self.sim.get_time(), 0.0, first, last,
+                             sequence, receptions)
+        self.sim.schedule_event(start_rx, sequence)
+        end_rx = Broadcast(self, Events.END_RX, source_node, packet,
+                           self.sim.get_time(), packet.get_duration(), first,
+                           last, sequence + 1, receptions)
+        self.sim.schedule_event(end_rx, sequence + 1)
+
+
+class Broadcast(object):
+    """
+    Series of START_RX or END_RX events notifying all the neighbors of a node
+    about the beginning or the end of a frame. The series occupies a single
+    entry in the queue of events: when the entry is extracted, the event for
+    the next neighbor is generated and the entry is put back in the queue with
+    the time of the following one. Neighbors are notified in order of
+    propagation delay, i.e., in the order the events would be extracted if
+    they were scheduled individually
+    """
+
+    __slots__ = ["channel", "event_type", "source", "packet", "start",
+                 "offset", "first", "last", "sequence", "receptions", "next"]
+
+    # tells the simulator that this is a series of events to be expanded
+    lazy = True
+
+    def __init__(self, channel, event_type, source, packet, start, offset,
+                 first, last, sequence, receptions):
+        """
+        Creates the series of events
+        :param channel: the channel, holding the adjacency arrays
+        :param event_type: either START_RX or END_RX
+        :param source: node transmitting the frame
+        :param packet: packet being transmitted
+        :param start: time at which the transmission starts
+        :param offset: time elapsed between the frame reaching a neighbor and
+        the event (0 for START_RX, the packet duration for END_RX)
+        :param first: index of the first neighbor in the adjacency arrays
+        :param last: index after the last neighbor in the adjacency arrays
+        :param sequence: sequence number of the event for the first neighbor.
+        events for other neighbors follow at steps of two
+        :param receptions: list of reception records for each neighbor,
+        shared by the START_RX and END_RX series
+        """
+        self.channel = channel
+        self.event_type = event_type
+        self.source = source
+        self.packet = packet
+        self.start = start
+        self.offset = offset
+        self.first = first
+        self.last = last
+        self.sequence = sequence
+        self.receptions = receptions
+        # index of the next neighbor to be notified
+        self.next = first
+
+    def get_time(self):
+        """
+        Returns the time of the event for the next neighbor
+        """
+        return (self.start + self.channel.delays[self.next]) + self.offset
+
+    def expand(self, entry):
+        """
+        Generates the event for the next neighbor and puts the entry back in
+        the queue for the following one, if any. Neighbors that would not
+        react to the event in their current state are not notified
+        :param entry: the entry of the queue of events holding this series
+        :returns: the event for the next neighbor, or None if the neighbor is
+        not interested in it
+        """
+        channel = self.channel
+        k = self.next
+        neighbor = channel.nodes[channel.adjacency[k]]
+        self.next = k + 1
+        if self.next < self.last:
+            entry[0] = self.get_time()
+            entry[1] = entry[1] + 2
+            channel.sim.queue.push(entry)
+        else:
+            entry[2] = None
+        if neighbor.is_passive(self.event_type):
+            return None
+        # the packet is shared by all receivers, while each of them gets its
+        # own reception record, as they will process the packet in different
+        # ways. one node might be able to receive it, one node might not
+        reception = self.receptions[k - self.first]
+        if reception is None:
+            reception = Reception(self.packet)
+            self.receptions[k - self.first] = reception
+        return channel.sim.new_event(channel.sim.get_time(), self.event_type,
+                                     neighbor, self.source, reception)
@@ -0,0 +1,96 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from io import BytesIO
+import os
+import pickle
+import zlib
+from errors import SimulationError
+
+# first bytes of a checkpoint file, identifying the format and its version
+MAGIC = b"SIMCKPT1"
+# persistent id of the simulator in the pickled state
+SIMULATOR = "sim"
+
+
+class CheckpointPickler(pickle.Pickler):
+    """
+    Pickles the state of a run. Modules keep a reference to the simulator,
+    which is a singleton and is not part of the state: it is saved as a
+    persistent id and replaced by the current instance when loading
+    """
+
+    def __init__(self, f, simulator):
+        pickle.Pickler.__init__(self, f, pickle.HIGHEST_PROTOCOL)
+        self.simulator = simulator
+
+    def persistent_id(self, obj):
+        if obj is self.simulator:
+            return SIMULATOR
+        return None
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    """
+    Loads the state pickled by CheckpointPickler
+    """
+
+    def __init__(self, f, simulator):
+        pickle.Unpickler.__init__(self, f)
+        self.simulator = simulator
+
+    def persistent_load(self, pid):
+        if pid == SIMULATOR:
+            return self.simulator
+        raise pickle.UnpicklingError("unknown persistent id %s" % pid)
+
+
+def save_checkpoint(file_name, simulator, run, state):
+    """
+    Saves the state of a run to a compressed checkpoint file. The file is
+    written under a temporary name and then renamed, so that a run killed
+    while saving leaves the previous checkpoint intact
+    :param file_name: name of the checkpoint file
+    :param simulator: the simulator instance
+    :param run: dictionary describing the run (config file, section, output
+    folder and run number), needed to load the configuration back
+    :param state: dictionary with the attributes of the simulator to save
+    """
+    buf = BytesIO()
+    CheckpointPickler(buf, simulator).dump((run, state))
+    tmp_file = file_name + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(MAGIC)
+        f.write(zlib.compress(buf.getvalue(), 1))
+    os.rename(tmp_file, file_name)
+
+
+def load_checkpoint(file_name, simulator):
+    """
+    Loads a checkpoint file saved by save_checkpoint()
+    :param file_name: name of the checkpoint file
+    :param simulator: the simulator instance, which modules are bound to
+    :returns: the run and state dictionaries passed to save_checkpoint()
+    """
+    try:
+        with open(file_name, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SimulationError("Checkpoint error: %s is not a "
+                                      "checkpoint file" % file_name)
+            data = zlib.decompress(f.read())
+    except (IOError, OSError, zlib.error) as e:
+        raise SimulationError("Checkpoint error: unable to read %s\n%s" %
+                              (file_name, str(e)))
+    return CheckpointUnpickler(BytesIO(data), simulator).load()
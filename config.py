@@ -13,9 +13,17 @@
 #
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
+from collections import OrderedDict
+import hashlib
+import itertools
 import json
+import marshal
+import os
 import re
+import stat
 import sys
+import tempfile
+from errors import SimulationError
 
 
 class Config:
@@ -27,6 +35,9 @@ class Config:
 
     # output file name parameter
     OUTPUT = "output"
+    # directory of the cache of parsed config files, within the cache
+    # directory of the user
+    CACHE_DIR = "sim_config"
 
     def __init__(self, config_file, section, out_dir):
         """
@@ -39,20 +50,16 @@ class Config:
         self.config_file = config_file
         self.section = section
         self.out_dir = out_dir
-        # load configuration from json
-        json_content = self.remove_comments(config_file)
-        try:
-            self.cfg = json.loads(json_content)
-        except Exception as e:
-            sys.stderr.write("Unable to parse %s\n" % self.config_file)
-            sys.stderr.write(e.message + "\n")
-            sys.exit(1)
+        # load configuration from json, or from the cache if the file has
+        # already been parsed
+        self.cfg = self.load(config_file)
         if section not in self.cfg:
-            sys.stderr.write("Error: the file %s does not contain section %s\n"
-                             % (config_file, section))
-            sys.exit(1)
+            raise SimulationError("Error: the file %s does not contain "
+                                  "section %s" % (config_file, section))
         # create the mapping between run numbers and parameters
         self.map_parameters()
+        # values replacing the ones in the config file for some parameters
+        self.overrides = {}
         # set the run number to 0 by default
         self.run_number = 0
         # compute the output file name for run number 0
@@ -71,39 +78,51 @@ class Config:
             a = 3, b = 5
             a = 3, b = 6
         so we will need to run 6 simulations. The run id goes from 0 to 5, and
-        for each run id we map a particular tuple of parameters. What we do here
-        is, given the run id, computing the index of a particular parameter
-        inside its array of values. For example, for the aforementioned case
-        this function computes
+        for each run id we map a particular tuple of parameters. The run id is
+        a mixed-radix number whose digits are the indices of the parameters
+        inside their arrays, so the index of a parameter is computed on demand
+        from the run id (see get_index()) instead of being stored for every
+        run. For the aforementioned case we get
             run = 0, a = 0, b = 0
-            run = 1, a = 1, b = 1
+            run = 1, a = 1, b = 0
             run = 2, a = 2, b = 0
             run = 3, a = 0, b = 1
-            run = 4, a = 1, b = 0
+            run = 4, a = 1, b = 1
             run = 5, a = 2, b = 1
+        where the order of the digits depends on the order in which parameters
+        are iterated
         """
+        # map from parameter name to the (radix, size) pair of its digit. the
+        # index of the parameter is run / radix % size
+        par_map = {}
         # compute the total number of runs. given that we are performing a
         # cartesian product, we simply multiply the sizes of all parameters
         # given as a list of values
         count = 1
-        for p in self.cfg[self.section].keys():
-            if type(self.cfg[self.section][p]) == list:
-                count = count * len(self.cfg[self.section][p])
-
-        # list of run ids, going from 0 to count - 1
-        runs = range(count)
-        # map from run number to index of a parameter inside its array
-        par_map = {}
-        prev_size = 1
         for p in self.cfg[self.section].keys():
             if type(self.cfg[self.section][p]) == list:
                 own_size = len(self.cfg[self.section][p])
-                par_map[p] = map((lambda x: x / prev_size % own_size), runs)
-                prev_size = prev_size * own_size
+                par_map[p] = (count, own_size)
+                count = count * own_size
 
         self.runs_count = count
         self.par_map = par_map
 
+    def get_index(self, param, run_number):
+        """
+        Returns the index of the value of a parameter for a given run
+        :param param: the parameter's name, which must be a list of values
+        :param run_number: the run number
+        """
+        (radix, size) = self.par_map[param]
+        return run_number // radix % size
+
+    def get_swept_params(self):
+        """
+        Returns the names of the parameters given as a list of values
+        """
+        return list(self.par_map.keys())
+
     def get_runs_count(self):
         """
         Returns the number of runs in the simulation
@@ -119,45 +138,208 @@ class Config:
         self.run_number = run_number
         self.compute_output_file_name()
 
-    def remove_comments(self, json_file):
+    def set_override(self, param, value):
+        """
+        Replaces the value of a parameter for all runs, e.g., to run a
+        parameter point with a seed that is not in the config file. The
+        output file name is updated accordingly
+        :param param: the parameter's name
+        :param value: the value to use instead of the configured one
+        """
+        self.overrides[param] = value
+        self.compute_output_file_name()
+
+    def clear_overrides(self):
+        """
+        Removes all the values set with set_override()
+        """
+        self.overrides = {}
+        self.compute_output_file_name()
+
+    def remove_comments(self, content):
         """
-        Removes the comments from a json file (non standard)
-        :param json_file: json file name
-        :returns: the content of the file without comments
+        Removes the comments from the content of a json file (non standard)
+        :param content: content of the json file
+        :returns: the content without comments
         """
-        # regular expression to remove comments from json file
+        # regular expression to remove comments from json file. all comments
+        # are removed in a single pass
         cr = re.compile('(^)?[^\S\n]*/(?:\*(.*?)\*/[^\S\n]*|/[^\n]*)($)?',
                         re.DOTALL | re.MULTILINE)
-        content = ''.join(open(json_file).readlines())
-        # looking for comments
-        match = cr.search(content)
-        while match:
-            # single line comment
-            content = content[:match.start()] + content[match.end():]
-            match = cr.search(content)
-        return content
+        return cr.sub('', content)
+
+    def load(self, config_file):
+        """
+        Loads the configuration from a json file. The parsed configuration is
+        cached on disk, so that the file is parsed only once as long as it is
+        not modified
+        :param config_file: file name of the config file
+        :returns: the configuration
+        """
+        with open(config_file, "rb") as f:
+            content = f.read()
+        # the cache is valid for this file, modification time and content.
+        # the version of python is part of the key as well, because the
+        # format of marshal depends on it
+        key = (os.path.abspath(config_file), os.path.getmtime(config_file),
+               hashlib.sha1(content).hexdigest(), tuple(sys.version_info[:2]))
+        cache_file = self.get_cache_file(config_file)
+        cfg = self.read_cache(cache_file, key)
+        if cfg is not None:
+            return cfg
+        try:
+            # keep the order of the keys, to store it in the cache
+            ordered = json.loads(self.remove_comments(content.decode("utf-8")),
+                                 object_pairs_hook=OrderedDict)
+        except Exception as e:
+            raise SimulationError("Unable to parse %s\n%s" %
+                                  (self.config_file, str(e)))
+        self.write_cache(cache_file, key, ordered)
+        return self.to_dict(ordered)
+
+    def to_dict(self, value):
+        """
+        Converts the OrderedDicts in a parsed configuration to dicts, building
+        them as json.loads() does
+        :param value: the parsed value
+        """
+        if isinstance(value, OrderedDict):
+            return dict((k, self.to_dict(v)) for (k, v) in value.items())
+        if isinstance(value, list):
+            return [self.to_dict(v) for v in value]
+        return value
+
+    def get_cache_file(self, config_file):
+        """
+        Returns the name of the cache file of a config file, placed in a
+        directory of the user (see get_cache_dir())
+        :param config_file: file name of the config file
+        :returns: the file name, or None if there is no usable cache directory
+        """
+        cache_dir = self.get_cache_dir()
+        if cache_dir is None:
+            return None
+        path = os.path.abspath(config_file).encode("utf-8")
+        return os.path.join(cache_dir, "%s.cache" %
+                            hashlib.sha1(path).hexdigest())
 
-    def get_param(self, param):
+    def get_cache_dir(self):
+        """
+        Returns the directory of the cache, $XDG_CACHE_HOME/sim_config or
+        ~/.cache/sim_config, creating it if needed. The cache is loaded with
+        marshal, so it must not be writable by other users: the directory is
+        not used if it is not owned by the user or is writable by others
+        :returns: the directory, or None if it cannot be used
+        """
+        base = os.environ.get("XDG_CACHE_HOME")
+        if not base:
+            base = os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(base, Config.CACHE_DIR)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0o700)
+            st = os.lstat(cache_dir)
+        except OSError:
+            return None
+        if not stat.S_ISDIR(st.st_mode) or not self.is_private(st):
+            return None
+        return cache_dir
+
+    def is_private(self, st):
+        """
+        Tells whether a file belongs to the user and cannot be modified by
+        other users
+        :param st: the result of os.stat() for the file
+        """
+        if not hasattr(os, "getuid"):
+            # no owners and permissions to check on this platform
+            return True
+        return st.st_uid == os.getuid() and \
+            (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)) == 0
+
+    def read_cache(self, cache_file, key):
+        """
+        Loads a parsed configuration from the cache
+        :param cache_file: name of the cache file
+        :param key: the key the cache must have been saved with
+        :returns: the configuration, or None if the cache is missing, stale or
+        could have been written by another user
+        """
+        if cache_file is None:
+            return None
+        try:
+            with open(cache_file, "rb") as f:
+                st = os.fstat(f.fileno())
+                if not stat.S_ISREG(st.st_mode) or not self.is_private(st):
+                    return None
+                (cached_key, sections) = marshal.load(f)
+        except Exception:
+            return None
+        if tuple(cached_key) != key:
+            return None
+        # sections are saved as tuples of (key, value) pairs in the order of
+        # the file. inserting them in that order gives the same dicts, with
+        # the same iteration order, as parsing the file
+        cfg = {}
+        for (name, value) in sections:
+            if isinstance(value, tuple):
+                value = dict(value)
+            cfg[name] = value
+        return cfg
+
+    def write_cache(self, cache_file, key, ordered):
+        """
+        Saves a parsed configuration to the cache. Errors are ignored, as the
+        cache is only an optimization
+        :param cache_file: name of the cache file
+        :param key: the key identifying the config file
+        :param ordered: the configuration parsed into OrderedDicts
+        """
+        if cache_file is None:
+            return
+        sections = []
+        for (name, value) in ordered.items():
+            if isinstance(value, OrderedDict):
+                value = tuple((k, self.to_dict(v)) for (k, v) in value.items())
+            else:
+                value = self.to_dict(value)
+            sections.append((name, value))
+        try:
+            # write to a temporary file first, so that concurrent runs never
+            # read a partial cache
+            (fd, tmp_file) = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((key, sections), f)
+            os.rename(tmp_file, cache_file)
+        except Exception:
+            pass
+
+    def get_param(self, param, default=None):
         """
         Returns the value of a parameter from the configuration file. Throws an
-        error if the parameter is not found
+        error if the parameter is not found and no default value is given
         :param param: the parameter's name
+        :param default: value returned for optional parameters that are not
+        found in the configuration file
         """
+        if param in self.overrides:
+            return self.overrides[param]
         # first check that param exists
         if param in self.cfg[self.section]:
             # if the parameter is in par_map, then it is a vector of values. In
             # such a case, we take a value depending on the run number
             if param in self.par_map:
-                index = self.par_map[param][self.run_number]
+                index = self.get_index(param, self.run_number)
                 return self.cfg[self.section][param][index]
             # if instead the parameter is not in par_map, then it's a single
             # value. Just return it
             else:
                 return self.cfg[self.section][param]
+        elif default is not None:
+            return default
         else:
-            sys.stderr.write("Error: parameter %s not found in section %s\n",
-                             (param, self.section))
-            sys.exit(1)
+            raise SimulationError("Error: parameter %s not found in "
+                                  "section %s" % (param, self.section))
 
     def compute_output_file_name(self):
         """
@@ -200,8 +382,8 @@ class Config:
                     var_name = ""
                 else:
                     # if not, there is a syntax error like {{
-                    sys.stderr.write("Invalid syntax for %s\n" % template)
-                    sys.exit(1)
+                    raise SimulationError("Invalid syntax for %s" %
+                                          template)
             elif template[i] == '}':
                 # if the character is }, then this is the end of a variable name
                 if state == INVAR:
@@ -212,10 +394,12 @@ class Config:
                     variables = var_name.split('.')
                     # start with the first one
                     var = variables[0]
-                    if var in self.par_map:
+                    if var in self.overrides:
+                        obj = self.overrides[var]
+                    elif var in self.par_map:
                         # if the variable is in the par_map, we need to get the
                         # correct instance depending on the run number
-                        index = self.par_map[var][self.run_number]
+                        index = self.get_index(var, self.run_number)
                         obj = config[var][index]
                         # if the parameter value is an array, instead of taking
                         # its value we take its index
@@ -240,8 +424,8 @@ class Config:
                 else:
                     # if we are not in the INVAR state, then we have a syntax
                     # error like }}
-                    sys.stderr.write("Invalid syntax for %s\n" % template)
-                    sys.exit(1)
+                    raise SimulationError("Invalid syntax for %s" %
+                                          template)
             else:
                 # this is neither a { nor a }. so it's a standard character
                 if state == INVAR:
@@ -254,14 +438,21 @@ class Config:
         if state == INVAR:
             # if we are not in the OUTVAR state at the end of the template,
             # then there is a syntax error
-            sys.stderr.write("Invalid syntax for %s\n" % template)
-            sys.exit(1)
+            raise SimulationError("Invalid syntax for %s" % template)
 
         self.output_file = self.out_dir + '/' + output
 
     def get_output_file(self):
         return self.output_file
 
+    def get_path(self, file_name):
+        """
+        Returns the path of a file referenced in the configuration. Relative
+        paths are relative to the folder of the config file
+        :param file_name: the file name, as given in the configuration
+        """
+        return os.path.join(os.path.dirname(self.config_file), file_name)
+
     def get_params(self, run_number):
         """
         Returns a textual representation of simulation parameters for a given
@@ -271,6 +462,98 @@ class Config:
         """
         params = ""
         config = self.cfg[self.section]
-        for par, val in self.par_map.iteritems():
-            params += "%s: %s " % (par, str(config[par][val[run_number]]))
+        for par in self.par_map:
+            index = self.get_index(par, run_number)
+            params += "%s: %s " % (par, str(config[par][index]))
         return params
+
+    def get_value(self, value, path):
+        """
+        Follows a path of keys inside a parameter value, e.g., ["lambda"]
+        inside an interarrival distribution
+        :param value: the parameter value
+        :param path: list of keys
+        :returns: the value found, or None if the path does not exist
+        """
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value
+
+    def parse_filters(self, filters):
+        """
+        Parses filters on parameter values given as strings like
+        "maxslots=500" or "interarrival.lambda=800". Values are parsed as
+        JSON, falling back to strings
+        :param filters: list of filter strings
+        :returns: list of (parameter name, path inside the value, value)
+        """
+        parsed = []
+        for f in filters:
+            if "=" not in f:
+                raise SimulationError("Error: invalid filter %s, expected "
+                                      "param=value" % f)
+            (name, value) = f.split("=", 1)
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            path = name.split(".")
+            if path[0] not in self.cfg[self.section]:
+                raise SimulationError("Error: parameter %s not found in "
+                                      "section %s" % (path[0],
+                                                      self.section))
+            parsed.append((path[0], path[1:], value))
+        return parsed
+
+    def matches(self, run_number, filters):
+        """
+        Tells whether the parameters of a run satisfy all filters
+        :param run_number: the run number
+        :param filters: filters returned by parse_filters()
+        """
+        config = self.cfg[self.section]
+        for (name, path, value) in filters:
+            if name in self.par_map:
+                v = config[name][self.get_index(name, run_number)]
+            else:
+                v = config[name]
+            if self.get_value(v, path) != value:
+                return False
+        return True
+
+    def iter_runs(self, filters=None, shard=None):
+        """
+        Enumerates the runs satisfying the given filters in increasing order,
+        without going through the ones that do not. Only the indices of the
+        filtered parameters are checked, the other digits of the run number
+        take all values
+        :param filters: filters returned by parse_filters()
+        :param shard: (i, n) pair to select only the i-th of every n runs
+        :returns: a generator of run numbers
+        """
+        if filters is None:
+            filters = []
+        config = self.cfg[self.section]
+        # allowed indices of each swept parameter, from the most significant
+        # digit to the least significant one
+        params = sorted(self.par_map.keys(), key=lambda p: self.par_map[p][0],
+                        reverse=True)
+        allowed = []
+        for p in params:
+            allowed.append(list(range(self.par_map[p][1])))
+        for (name, path, value) in filters:
+            if name in self.par_map:
+                digit = params.index(name)
+                allowed[digit] = [i for i in allowed[digit]
+                                  if self.get_value(config[name][i], path) ==
+                                  value]
+            elif self.get_value(config[name], path) != value:
+                return iter([])
+        radices = [self.par_map[p][0] for p in params]
+        runs = (sum(i * r for (i, r) in zip(indices, radices))
+                for indices in itertools.product(*allowed))
+        if shard is not None:
+            runs = itertools.islice(runs, shard[0], None, shard[1])
+        return runs
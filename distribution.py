@@ -14,7 +14,7 @@
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
 import random
-import sys
+from errors import SimulationError
 
 
 class Distribution:
@@ -42,7 +42,14 @@ class Distribution:
     # exponential random variable
     EXPONENTIAL = "exp"
 
-    def __init__(self, config):
+    # samplers that can be selected in the config file. the python sampler
+    # draws one value at a time from a random.Random, the numpy sampler draws
+    # blocks of BLOCK_SIZE values from a numpy Generator
+    PYTHON = "python"
+    NUMPY = "numpy"
+    BLOCK_SIZE = 1024
+
+    def __init__(self, config, rng=random, sampler=PYTHON):
         """
         Instantiates the distribution
         :param config: an object used for configuring the distribution in the
@@ -53,6 +60,10 @@ class Distribution:
         with mean being 1/lambda. "lambda" : value can also be used
         {"distribution" : "unif", "min" : value, "max" : value}, uniform random
         variable between min and max
+        :param rng: the PRNG to draw values from. by default, the functions of
+        the random module are used
+        :param sampler: either Distribution.PYTHON, or Distribution.NUMPY if
+        rng is a numpy Generator
         """
         try:
             # find the correct distribution depending on the specified name
@@ -66,20 +77,31 @@ class Distribution:
                         integer = True
                 except Exception:
                     integer = False
-                self.d = Uniform(config[Distribution.MIN],
-                                 config[Distribution.MAX], integer)
+                if sampler == Distribution.NUMPY:
+                    self.d = BlockUniform(config[Distribution.MIN],
+                                          config[Distribution.MAX], integer,
+                                          rng)
+                else:
+                    self.d = Uniform(config[Distribution.MIN],
+                                     config[Distribution.MAX], integer, rng)
             elif config[Distribution.DISTRIBUTION] == Distribution.EXPONENTIAL:
                 if Distribution.MEAN in config:
-                    self.d = Exp(config[Distribution.MEAN])
+                    mean = config[Distribution.MEAN]
+                else:
+                    mean = 1.0/config[Distribution.LAMBDA]
+                if sampler == Distribution.NUMPY:
+                    self.d = BlockExp(mean, rng)
                 else:
-                    self.d = Exp(1.0/config[Distribution.LAMBDA])
+                    self.d = Exp(mean, rng)
             else:
-                print("Distribution error: unimplemented distribution %s",
-                      config[Distribution.DISTRIBUTION])
+                raise SimulationError("Distribution error: unimplemented "
+                                      "distribution %s" %
+                                      config[Distribution.DISTRIBUTION])
+        except SimulationError:
+            raise
         except Exception as e:
-            print("Error while reading distribution parameters")
-            print(e.message)
-            sys.exit(1)
+            raise SimulationError("Error while reading distribution "
+                                  "parameters\n%s" % str(e))
 
     def get_value(self):
         return self.d.get_value()
@@ -106,19 +128,21 @@ class Uniform:
     Uniform random variable
     """
 
-    def __init__(self, min, max, integer=False):
+    def __init__(self, min, max, integer=False, rng=random):
         """
         Constructor
         :param min: minimum value
         :param max: maximum value
         :param integer: whether to use integer or floating point numbers
+        :param rng: the PRNG to draw values from
         """
         self.min = min
         self.max = max
         self.integer = integer
+        self.rng = rng
 
     def get_value(self):
-        value = random.uniform(self.min, self.max)
+        value = self.rng.uniform(self.min, self.max)
         if self.integer:
             return round(value)
         else:
@@ -130,12 +154,74 @@ class Exp:
     Exponential random variable
     """
 
-    def __init__(self, mean):
+    def __init__(self, mean, rng=random):
         """
         Constructor
         :param mean: mean value (1/lambda)
+        :param rng: the PRNG to draw values from
         """
         self.l = 1/mean
+        self.rng = rng
+
+    def get_value(self):
+        return self.rng.expovariate(self.l)
+
+
+class BlockUniform:
+    """
+    Uniform random variable drawing values from a numpy Generator in blocks
+    """
+
+    def __init__(self, min, max, integer, generator):
+        """
+        Constructor
+        :param min: minimum value
+        :param max: maximum value
+        :param integer: whether to use integer or floating point numbers
+        :param generator: the numpy Generator to draw values from
+        """
+        self.min = min
+        self.max = max
+        self.integer = integer
+        self.generator = generator
+        self.values = []
+        self.index = 0
+
+    def get_value(self):
+        if self.index == len(self.values):
+            self.values = self.generator.uniform(
+                self.min, self.max, Distribution.BLOCK_SIZE).tolist()
+            self.index = 0
+        value = self.values[self.index]
+        self.index = self.index + 1
+        if self.integer:
+            return round(value)
+        else:
+            return value
+
+
+class BlockExp:
+    """
+    Exponential random variable drawing values from a numpy Generator in
+    blocks
+    """
+
+    def __init__(self, mean, generator):
+        """
+        Constructor
+        :param mean: mean value (1/lambda)
+        :param generator: the numpy Generator to draw values from
+        """
+        self.mean = mean
+        self.generator = generator
+        self.values = []
+        self.index = 0
 
     def get_value(self):
-        return random.expovariate(self.l)
+        if self.index == len(self.values):
+            self.values = self.generator.exponential(
+                self.mean, Distribution.BLOCK_SIZE).tolist()
+            self.index = 0
+        value = self.values[self.index]
+        self.index = self.index + 1
+        return value
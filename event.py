@@ -16,11 +16,20 @@
 from events import Events
 
 
-class Event:
+class Event(object):
     """
-    Defines the basic structure of an event
+    Defines the basic structure of an event. Events are created in large
+    numbers, so their attributes are stored in slots rather than in a per
+    instance dictionary. Modules should obtain events through
+    Sim.new_event(), which recycles the events already processed
     """
 
+    __slots__ = ["event_time", "event_type", "destination", "source", "obj"]
+
+    # whether the object in the queue of events stands for a series of events
+    # to be expanded by the simulator. see Broadcast in channel.py
+    lazy = False
+
     def __init__(self, event_time, event_type, destination, source, obj=None):
         """
         Creates an event.
@@ -36,6 +45,17 @@ class Event:
         self.source = source
         self.obj = obj
 
+    def recycle(self, event_time, event_type, destination, source, obj=None):
+        """
+        Reinitializes an event that has already been processed, so that it can
+        be scheduled again. Parameters are the same as for the constructor
+        """
+        self.event_time = event_time
+        self.event_type = event_type
+        self.destination = destination
+        self.source = source
+        self.obj = obj
+
     def get_time(self):
         """
         Returns event time
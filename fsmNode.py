@@ -16,7 +16,7 @@
 from module import Module
 from distribution import Distribution
 from packet import Packet
-from event import Event
+from packetqueue import PacketQueue
 from events import Events
 from channel import Channel
 import sim
@@ -47,6 +47,12 @@ class FSMNode(Module):
 
     STAY = -1
 
+    # indices of the random streams of a node, see Sim.get_stream()
+    STREAM_INTERARRIVAL = 0
+    STREAM_SIZE = 1
+    STREAM_PROC_TIME = 2
+    STREAM_SLOTS = 3
+
     def __init__(self, config, channel, x, y):
         """
         :param initialState: The state the FSM has to start from
@@ -61,9 +67,36 @@ class FSMNode(Module):
         # load configuration parameters
         self.datarate = config.get_param(FSMNode.DATARATE)
         self.queue_size = config.get_param(FSMNode.QUEUE)
-        self.interarrival = Distribution(config.get_param(FSMNode.INTERARRIVAL))
-        self.size = Distribution(config.get_param(FSMNode.SIZE))
-        self.proc_time = Distribution(config.get_param(FSMNode.PROC_TIME))
+        self.create_distributions(config)
+
+        # save position
+        self.x = x
+        self.y = y
+
+        # save channel
+        self.channel = channel
+
+        # queue of packets to be sent
+        self.queue = PacketQueue(self.queue_size)
+
+    def create_distributions(self, config):
+        """
+        Creates the random variables of the node, drawing from the streams
+        given by the simulator. Called again when the simulator is reseeded
+        :param config: the set of configs loaded by the simulator
+        """
+        sampler = self.sim.get_sampler()
+        self.interarrival = Distribution(
+            config.get_param(FSMNode.INTERARRIVAL),
+            self.sim.get_stream(self.get_id(), FSMNode.STREAM_INTERARRIVAL),
+            sampler)
+        self.size = Distribution(
+            config.get_param(FSMNode.SIZE),
+            self.sim.get_stream(self.get_id(), FSMNode.STREAM_SIZE), sampler)
+        self.proc_time = Distribution(
+            config.get_param(FSMNode.PROC_TIME),
+            self.sim.get_stream(self.get_id(), FSMNode.STREAM_PROC_TIME),
+            sampler)
 
         # a slot lasts the maximum time a packet would take to be transmitted
         max_pkt_time = (config.get_param(FSMNode.SIZE)[Distribution.MAX] * 8) / self.datarate
@@ -74,21 +107,94 @@ class FSMNode(Module):
         # the slots distribution for a node
         self.slots = Distribution({"distribution" : "unif",
                                    "int" : True, "min" : 0,
-                                   "max" : config.get_param(FSMNode.MAXSLOTS) })
-
-        # save position
-        self.x = x
-        self.y = y
-
-        # save channel
-        self.channel = channel
-
-        # queue of packets to be sent
-        self.queue = []
+                                   "max" : config.get_param(FSMNode.MAXSLOTS) },
+                                  self.sim.get_stream(self.get_id(),
+                                                      FSMNode.STREAM_SLOTS),
+                                  sampler)
 
     def set_transitions(self, initialState, transitions):
+        """
+        Sets the initial state and the transition table, compiling the table
+        into a list of lists indexed by state and event type. Pairs that are
+        not in the table are mapped to a transition function that raises an
+        error, so that no check is needed when handling events
+        :param initialState: the state the FSM starts from
+        :param transitions: dictionary mapping pairs (State, Event) to a
+        transition function. States and events must be non-negative integers
+        """
+        for (state, event_type), action in transitions.items():
+            if not isinstance(state, int) or state < 0 or \
+               not isinstance(event_type, int) or event_type < 0:
+                raise AssertionError("Invalid transition (%s, %s)" %
+                                     (state, event_type))
+            if not callable(action):
+                raise AssertionError("Transition (%s, %s) is not callable" %
+                                     (state, event_type))
         self.state = initialState
+        self.compile_transitions(transitions)
+
+    def compile_transitions(self, transitions):
+        """
+        Compiles the transition table into self.table and self.passive,
+        without changing the current state
+        :param transitions: dictionary mapping pairs (State, Event) to a
+        transition function
+        """
+        states = max([self.state] + [k[0] for k in transitions]) + 1
+        event_types = max([Events.PACKET_ENQUEUED] +
+                          [k[1] for k in transitions]) + 1
         self.transitions = transitions
+        self.table = [[transitions.get((state, event_type),
+                                       self.unhandled(state, event_type))
+                       for event_type in range(event_types)]
+                      for state in range(states)]
+        # pairs (State, Event) for which the node just stays in the same
+        # state. events from other modules can be skipped in such states
+        self.passive = [[transitions.get((state, event_type)) == self.stay
+                         for event_type in range(event_types)]
+                        for state in range(states)]
+
+    def __getstate__(self):
+        """
+        Returns the state saved in checkpoints. Transition functions are
+        bound methods, which cannot be pickled, so they are saved by name and
+        the compiled tables are rebuilt when loading
+        """
+        state = self.__dict__.copy()
+        state["transitions"] = dict((k, action.__name__) for (k, action) in
+                                    self.transitions.items())
+        del state["table"]
+        del state["passive"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the state saved by __getstate__()
+        """
+        self.__dict__.update(state)
+        self.compile_transitions(dict((k, getattr(self, name)) for (k, name)
+                                      in state["transitions"].items()))
+
+    def unhandled(self, state, event_type):
+        """
+        Returns the transition function for a pair (State, Event) missing from
+        the transition table, which raises an error if ever called
+        :param state: the state
+        :param event_type: the event type
+        """
+        def reject(event):
+            raise AssertionError("Unhandled event %s in state %s" %
+                                 (event_type, state))
+        return reject
+
+    def is_passive(self, event_type):
+        """
+        Tells whether an event of the given type would leave the node
+        unaffected in its current state, so that there is no need to deliver
+        it
+        :param event_type: the type of the event
+        """
+        return self.passive[self.state][event_type]
 
     def initialize(self):
         """
@@ -107,14 +213,16 @@ class FSMNode(Module):
         packet_size = self.size.get_value()
 
         # generate an event setting this node as destination
-        event = Event(self.sim.get_time() + arrival, Events.PACKET_ARRIVAL,
-                      self, self, packet_size)
+        event = self.sim.new_event(self.sim.get_time() + arrival,
+                                   Events.PACKET_ARRIVAL, self, self,
+                                   packet_size)
         self.sim.schedule_event(event)
 
     def handle_event(self, event):
         """
         Handles the given event with a mapped transition function.
-        If there is no mapping an exeception will be raised.
+        If there is no mapping an exeception will be raised. Transition
+        functions for PACKET_ENQUEUED receive the PACKET_ARRIVAL event
         :param event: the event to handle
         """
 
@@ -128,18 +236,10 @@ class FSMNode(Module):
             # same state
             if(not self.enqueue_arrived(event)):
                 return
-            else:
-                event = Event(event.get_time(), Events.PACKET_ENQUEUED,
-                              event.get_destination(), event.get_source(),
-                              event.get_obj())
-
-        key = (self.state, event.get_type())
-
-        if key not in self.transitions.keys():
-            raise AssertionError("Unhandled event %s in state %s" %
-                                 (event.get_type(), self.state))
-
-        action = self.transitions[key]
+            # Otherwise handle the arrival as a PACKET_ENQUEUED event
+            action = self.table[self.state][Events.PACKET_ENQUEUED]
+        else:
+            action = self.table[self.state][event.get_type()]
 
         nextState = action(event)
 
@@ -154,9 +254,9 @@ class FSMNode(Module):
         packet_size = event.get_obj()
         self.logger.log_arrival(self, packet_size)
 
-        if self.queue_size == 0 or len(self.queue) < self.queue_size:
+        if not self.queue.is_full():
             # if queue size is infinite or there is still space
-            self.queue.append(packet_size)
+            self.queue.append(packet_size, self.sim.get_time())
             self.logger.log_queue_length(self, len(self.queue))
             return True
         else:
@@ -170,18 +270,18 @@ class FSMNode(Module):
     def transmit(self):
         assert(len(self.queue) > 0)
 
-        packet_size = self.queue.pop(0)
+        self.logger.log_queue_delay(self, self.sim.get_time() -
+                                    self.queue.get_arrival())
+        packet_size = self.queue.pop()
         self.logger.log_queue_length(self, len(self.queue))
 
         duration = packet_size * 8 / self.datarate
         # transmit packet
-        packet = Packet(packet_size, duration)
-        if(packet.get_id() == 19):
-            pass
+        packet = Packet(packet_size, duration, self.sim.next_packet_id())
         self.channel.start_transmission(self, packet)
         # schedule end of transmission
-        end_tx = Event(self.sim.get_time() + duration, Events.END_TX, self,
-                       self, packet)
+        end_tx = self.sim.new_event(self.sim.get_time() + duration,
+                                    Events.END_TX, self, self, packet)
         self.sim.schedule_event(end_tx)
 
     def get_posx(self):
@@ -197,3 +297,9 @@ class FSMNode(Module):
         :returns: y position in meters
         """
         return self.y
+
+    def get_queue(self):
+        """
+        Returns the queue of packets waiting to be transmitted
+        """
+        return self.queue
@@ -13,8 +13,19 @@
 #
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
+from array import array
+import gzip
+import os
+import struct
+import sys
 import sim
+from errors import SimulationError
 from packet import Packet
+from metrics import Metrics
+
+# output files inherited from the parent process by forked replications, see
+# Log.restart()
+inherited_files = []
 
 
 class Log:
@@ -34,9 +45,18 @@ class Log:
     LOG_QUEUE_SIZE = LOG_QUEUE_DROPPED + 1
     # use to log node state in time
     LOG_NODE_STATE = LOG_QUEUE_SIZE + 1
+    # use to log the maximum queue size reached by a node
+    LOG_QUEUE_HIGH_WATER = LOG_NODE_STATE + 1
+
+    # output formats that can be selected in the config file
+    CSV = "csv"
+    BINARY = "binary"
+    # no trace is written, only the summary of the metrics
+    NONE = "none"
 
     def __init__(self, output_file, log_packets=True, log_queue_drops=True,
-                 log_arrivals=True, log_queue_lengths=False, log_states=False):
+                 log_arrivals=True, log_queue_lengths=False, log_states=False,
+                 log_high_water=False, summary_file=None):
         """
         Constructor.
         :param output_file: output file name. will be overwritten if already
@@ -47,28 +67,160 @@ class Log:
         :param log_arrivals: enable/disable logging of packet arrivals
         :param log_queue_lengths: enable/disable logging of queue lengths
         :param log_states: enable/disable logging of the state of nodes
+        :param log_high_water: enable/disable logging of the maximum queue
+        length of each node at the end of the simulation
+        :param summary_file: if specified, metrics are computed during the
+        simulation and saved to this file when the log is closed
         """
         self.sim = sim.Sim.Instance()
-        self.log_file = open(output_file, "w")
-        self.log_file.write("time,src,dst,event,size\n")
+        self.output_file = output_file
+        self.open_file()
+        self.summary_file = summary_file
+        if summary_file is None:
+            self.metrics = None
+        else:
+            self.metrics = Metrics()
+        self.bind_record()
         self.log_packets = log_packets
         self.log_queue_drops = log_queue_drops
         self.log_arrivals = log_arrivals
         self.log_queue_lengths = log_queue_lengths
         self.log_states = log_states
+        self.log_high_water = log_high_water
+
+    def bind_record(self):
+        """
+        Selects the method record() is bound to, depending on whether metrics
+        are enabled
+        """
+        if self.metrics is None:
+            self.record = self.write_record
+        else:
+            self.record = self.record_with_metrics
+
+    def open_file(self):
+        """
+        Opens the output file and writes the header
+        """
+        self.log_file = open(self.output_file, "w")
+        self.log_file.write("time,src,dst,event,size\n")
 
-    def log_packet(self, source, destination, packet):
+    def sync(self):
+        """
+        Writes the buffered records to the output file
+        """
+        self.log_file.flush()
+
+    def rename(self, output_file, summary_file=None):
+        """
+        Changes the names of the output files of the run. The output file is
+        renamed while it is open, and logging continues in it. The summary is
+        only written at the end, under the new name
+        :param output_file: new name of the output file
+        :param summary_file: new name of the summary file, if metrics are
+        enabled
+        """
+        if hasattr(self, "log_file"):
+            os.rename(self.output_file, output_file)
+        self.output_file = output_file
+        self.summary_file = summary_file
+
+    def restart(self, output_file, summary_file=None):
+        """
+        Continues logging on a new output file, discarding the metrics
+        computed so far. Used by replications forked from a warmed-up run:
+        the current output file belongs to the parent process, so it is not
+        closed, as closing a gzip file would write its trailer there. It
+        stays referenced until the process exits
+        :param output_file: name of the new output file
+        :param summary_file: name of the new summary file, if metrics are
+        enabled
+        """
+        if hasattr(self, "log_file"):
+            inherited_files.append(self.log_file)
+        self.output_file = output_file
+        self.summary_file = summary_file
+        self.open_file()
+        if summary_file is not None:
+            self.metrics = Metrics(self.sim.get_time())
+        self.bind_record()
+
+    def reopen_file(self, offset):
+        """
+        Opens the output file again when resuming from a checkpoint, dropping
+        what has been written after the checkpoint
+        :param offset: length of the file when the checkpoint was saved
+        """
+        self.log_file = open(self.output_file, "r+")
+        self.log_file.seek(offset)
+        self.log_file.truncate()
+
+    def __getstate__(self):
+        """
+        Returns the state saved in checkpoints. The output file is flushed
+        and saved as its current length, see reopen_file()
+        """
+        state = self.__dict__.copy()
+        del state["record"]
+        if "log_file" in state:
+            self.log_file.flush()
+            state["log_file"] = self.log_file.tell()
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the state saved by __getstate__()
+        """
+        self.__dict__.update(state)
+        self.bind_record()
+        if "log_file" in state:
+            self.reopen_file(state["log_file"])
+
+    def write_record(self, time, src, dst, event, size):
+        """
+        Writes a record to the output file
+        :param time: simulation time
+        :param src: id of the source node
+        :param dst: id of the destination node
+        :param event: type of the record
+        :param size: packet size, or the value being logged
+        """
+        self.log_file.write("%f,%d,%d,%d,%d\n" % (time, src, dst, event, size))
+
+    def record_with_metrics(self, time, src, dst, event, size):
+        """
+        Updates the metrics with a record and writes it. Used in place of
+        write_record() when metrics are enabled. Parameters are the same
+        """
+        self.metrics.record(time, src, dst, event, size)
+        self.write_record(time, src, dst, event, size)
+
+    def close(self):
+        """
+        Writes pending records and closes the output file
+        """
+        self.log_file.close()
+        self.save_summary()
+
+    def save_summary(self):
+        """
+        Saves the metrics of the run, if enabled
+        """
+        if self.metrics is not None:
+            self.metrics.save(self.summary_file, self.sim.get_time(),
+                              len(self.sim.nodes))
+
+    def log_packet(self, source, destination, reception):
         """
         Logs the result of a packet reception.
         :param source: source node
         :param destination: destination node id
-        :param packet: the packet to log
+        :param reception: the reception record of the packet to log
         """
         if self.log_packets:
-            self.log_file.write("%f,%d,%d,%d,%d\n" %
-                                (self.sim.get_time(), source.get_id(),
-                                 destination.get_id(), packet.get_state(),
-                                 packet.get_size()))
+            self.record(self.sim.get_time(), source.get_id(),
+                        destination.get_id(), reception.get_state(),
+                        reception.get_size())
 
     def log_queue_drop(self, source, packet_size):
         """
@@ -77,10 +229,9 @@ class Log:
         :param packet_size: size of the packet being dropped
         """
         if self.log_queue_drops:
-            self.log_file.write("%f,%d,%d,%d,%d\n" %
-                                (self.sim.get_time(), source.get_id(),
-                                 source.get_id(), Log.LOG_QUEUE_DROPPED,
-                                 packet_size))
+            self.record(self.sim.get_time(), source.get_id(),
+                        source.get_id(), Log.LOG_QUEUE_DROPPED,
+                        packet_size)
 
     def log_arrival(self, source, packet_size):
         """
@@ -89,10 +240,9 @@ class Log:
         :param packet_size: size of the packet being dropped
         """
         if self.log_arrivals:
-            self.log_file.write("%f,%d,%d,%d,%d\n" %
-                                (self.sim.get_time(), source.get_id(),
-                                 source.get_id(), Log.LOG_GENERATED,
-                                 packet_size))
+            self.record(self.sim.get_time(), source.get_id(),
+                        source.get_id(), Log.LOG_GENERATED,
+                        packet_size)
 
     def log_queue_length(self, node, length):
         """
@@ -100,10 +250,12 @@ class Log:
         :param node: node
         :param length: length of the queue
         """
+        if self.metrics is not None:
+            self.metrics.queue_length(self.sim.get_time(), node.get_id(),
+                                      length)
         if self.log_queue_lengths:
-            self.log_file.write("%f,%d,%d,%d,%d\n" %
-                                (self.sim.get_time(), node.get_id(),
-                                 node.get_id(), Log.LOG_QUEUE_SIZE, length))
+            self.record(self.sim.get_time(), node.get_id(),
+                        node.get_id(), Log.LOG_QUEUE_SIZE, length)
 
     def log_state(self, node, state):
         """
@@ -112,6 +264,251 @@ class Log:
         :param state: state of the node
         """
         if self.log_states:
-            self.log_file.write("%f,%d,%d,%d,%d\n" %
-                                (self.sim.get_time(), node.get_id(),
-                                 node.get_id(), Log.LOG_NODE_STATE, state))
+            self.record(self.sim.get_time(), node.get_id(),
+                        node.get_id(), Log.LOG_NODE_STATE, state)
+
+    def log_queue_delay(self, node, delay):
+        """
+        Logs the time a packet spent in the queue of a particular node. The
+        delay only goes into the metrics, not into the trace
+        :param node: node
+        :param delay: queueing delay of the packet
+        """
+        if self.metrics is not None:
+            self.metrics.queue_delay(node.get_id(), delay)
+
+    def log_queue_high_water(self, node, length, memory):
+        """
+        Logs the maximum length reached by the queue of a particular node
+        :param node: node
+        :param length: maximum length of the queue
+        :param memory: memory used by the queue, in bytes. It only goes into
+        the metrics
+        """
+        if self.metrics is not None:
+            self.metrics.queue_stats(node.get_id(), length, memory)
+        if self.log_high_water:
+            self.record(self.sim.get_time(), node.get_id(),
+                        node.get_id(), Log.LOG_QUEUE_HIGH_WATER,
+                        length)
+
+
+class BinaryLog(Log):
+    """
+    Logs records in a binary columnar format. Records are stored in typed
+    column buffers and written in chunks, so that no string formatting is done
+    during the simulation and times keep their full precision. The file starts
+    with the 8 bytes MAGIC, followed by chunks. Each chunk is a little endian
+    uint32 with the number n of records, followed by the columns: n float64
+    times, n int32 sources, n int32 destinations, n int8 events and n int32
+    sizes, all little endian. The file can optionally be gzip compressed
+    """
+
+    # identifies the format and its version
+    MAGIC = b"SIMLOG01"
+    # number of records per chunk
+    CHUNK_SIZE = 65536
+    # column names and their typecodes
+    COLUMNS = [("time", "d"), ("src", "i"), ("dst", "i"), ("event", "b"),
+               ("size", "i")]
+    # attributes holding the column buffers and their typecodes
+    BUFFERS = [("times", "d"), ("srcs", "i"), ("dsts", "i"), ("events", "b"),
+               ("sizes", "i")]
+
+    def __init__(self, output_file, compress=False, **kwargs):
+        """
+        Constructor. Other parameters are the same as for Log
+        :param compress: gzip compress the output file
+        """
+        self.compress = compress
+        # preallocated column buffers and number of records in them
+        self.times = array("d", [0]) * self.CHUNK_SIZE
+        self.srcs = array("i", [0]) * self.CHUNK_SIZE
+        self.dsts = array("i", [0]) * self.CHUNK_SIZE
+        self.events = array("b", [0]) * self.CHUNK_SIZE
+        self.sizes = array("i", [0]) * self.CHUNK_SIZE
+        self.count = 0
+        Log.__init__(self, output_file, **kwargs)
+
+    def open_file(self):
+        if self.compress:
+            self.log_file = gzip.open(self.output_file, "wb")
+        else:
+            self.log_file = open(self.output_file, "wb")
+        self.log_file.write(self.MAGIC)
+
+    def sync(self):
+        self.flush()
+        self.log_file.flush()
+
+    def reopen_file(self, offset):
+        # a gzip stream cannot be truncated and continued. Sim refuses to
+        # checkpoint runs with compressed logs
+        self.log_file = open(self.output_file, "r+b")
+        self.log_file.seek(offset)
+        self.log_file.truncate()
+
+    def __getstate__(self):
+        """
+        Returns the state saved in checkpoints. Only the filled part of the
+        column buffers is saved, see Log.__getstate__()
+        """
+        state = Log.__getstate__(self)
+        for (name, typecode) in self.BUFFERS:
+            state[name] = state[name][:self.count]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the state saved by __getstate__(), allocating the column
+        buffers again
+        """
+        Log.__setstate__(self, state)
+        for (name, typecode) in self.BUFFERS:
+            buf = getattr(self, name)
+            buf.extend(array(typecode, [0]) * (self.CHUNK_SIZE - len(buf)))
+
+    def write_record(self, time, src, dst, event, size):
+        i = self.count
+        self.times[i] = time
+        self.srcs[i] = src
+        self.dsts[i] = dst
+        self.events[i] = event
+        self.sizes[i] = int(size)
+        self.count = i + 1
+        if self.count == self.CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the records in the buffers to the output file as a chunk
+        """
+        if self.count == 0:
+            return
+        n = self.count
+        self.log_file.write(struct.pack("<I", n))
+        for column in [self.times, self.srcs, self.dsts, self.events,
+                       self.sizes]:
+            chunk = column[:n]
+            if sys.byteorder == "big":
+                chunk.byteswap()
+            self.log_file.write(to_bytes(chunk))
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        Log.close(self)
+
+
+class NullLog(Log):
+    """
+    Logger writing no trace, used when only the summary of the metrics is
+    needed
+    """
+
+    def open_file(self):
+        pass
+
+    def write_record(self, time, src, dst, event, size):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        self.save_summary()
+
+
+def to_bytes(a):
+    """
+    Returns the content of an array as bytes, on both Python 2 and 3
+    :param a: the array
+    """
+    if hasattr(a, "tobytes"):
+        return a.tobytes()
+    return a.tostring()
+
+
+def strip_extension(output_file):
+    """
+    Removes the .csv extension from the configured output file name
+    :param output_file: output file name from the configuration
+    """
+    if output_file.endswith(".csv"):
+        return output_file[:-len(".csv")]
+    return output_file
+
+
+def get_summary_file_name(output_file):
+    """
+    Returns the name of the file where the metrics of the run are saved,
+    replacing the .csv extension of the configured name with .json
+    :param output_file: output file name from the configuration
+    """
+    return strip_extension(output_file) + ".json"
+
+
+def get_profile_file_name(output_file):
+    """
+    Returns the name of the file where the profiling report of the run is
+    saved, replacing the .csv extension of the configured name with
+    .profile.json
+    :param output_file: output file name from the configuration
+    """
+    return strip_extension(output_file) + ".profile.json"
+
+
+def get_checkpoint_file_name(output_file):
+    """
+    Returns the name of the file where the checkpoints of the run are saved,
+    replacing the .csv extension of the configured name with .ckpt
+    :param output_file: output file name from the configuration
+    """
+    return strip_extension(output_file) + ".ckpt"
+
+
+def get_log_file_name(output_file, log_format, compress):
+    """
+    Returns the name of the output file for the given format, replacing the
+    .csv extension of the configured name with .bin for binary logs and
+    adding .gz for compressed ones. When no trace is written, the output file
+    is the summary of the metrics
+    :param output_file: output file name from the configuration
+    :param log_format: Log.CSV, Log.BINARY or Log.NONE
+    :param compress: whether binary logs are compressed
+    """
+    if log_format == Log.CSV:
+        return output_file
+    if log_format == Log.NONE:
+        return get_summary_file_name(output_file)
+    output_file = strip_extension(output_file) + ".bin"
+    if compress:
+        output_file = output_file + ".gz"
+    return output_file
+
+
+def create_log(output_file, log_format, compress, summary_file=None,
+               log_high_water=False):
+    """
+    Instantiates the data logger for the given output format
+    :param output_file: output file name, as returned by get_log_file_name()
+    :param log_format: Log.CSV, Log.BINARY or Log.NONE
+    :param compress: gzip compress binary logs
+    :param summary_file: file where metrics are saved, None to disable them
+    :param log_high_water: log the maximum length reached by each queue
+    :returns: the logger instance
+    """
+    if log_format == Log.CSV:
+        return Log(output_file, log_high_water=log_high_water,
+                   summary_file=summary_file)
+    elif log_format == Log.BINARY:
+        return BinaryLog(output_file, compress,
+                         log_high_water=log_high_water,
+                         summary_file=summary_file)
+    elif log_format == Log.NONE:
+        if summary_file is None:
+            raise SimulationError("Log error: log format %s requires "
+                                  "metrics to be enabled" % log_format)
+        return NullLog(output_file, log_high_water=log_high_water,
+                       summary_file=summary_file)
+    raise SimulationError("Log error: unknown log format %s" % log_format)
@@ -0,0 +1,113 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from array import array
+import gzip
+import struct
+import sys
+# the simulator must be imported before the log module, which depends on it
+import sim
+from errors import SimulationError
+from log import BinaryLog
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def open_log(file_name):
+    """
+    Opens a binary log file, compressed or not, and checks its header
+    :param file_name: name of the log file
+    :returns: the file object, positioned after the header
+    """
+    if file_name.endswith(".gz"):
+        f = gzip.open(file_name, "rb")
+    else:
+        f = open(file_name, "rb")
+    if f.read(len(BinaryLog.MAGIC)) != BinaryLog.MAGIC:
+        f.close()
+        raise SimulationError("Log error: %s is not a binary log file" %
+                              file_name)
+    return f
+
+
+def read_column(data, typecode, n):
+    """
+    Converts the little endian content of a column into an array
+    :param data: bytes read from the file
+    :param typecode: typecode of the column
+    :param n: number of values in the column
+    :returns: a numpy array if numpy is available, an array otherwise
+    """
+    if numpy is not None:
+        dtype = numpy.dtype(typecode).newbyteorder("<")
+        return numpy.frombuffer(data, dtype=dtype, count=n)
+    column = array(typecode)
+    if hasattr(column, "frombytes"):
+        column.frombytes(data)
+    else:
+        column.fromstring(data)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def iter_chunks(file_name):
+    """
+    Iterates over the chunks of a binary log file, without loading the whole
+    file in memory
+    :param file_name: name of the log file
+    :returns: a generator of dictionaries mapping column names (time, src,
+    dst, event, size) to numpy arrays, or to arrays if numpy is not installed
+    """
+    f = open_log(file_name)
+    try:
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                break
+            n = struct.unpack("<I", header)[0]
+            chunk = {}
+            for (name, typecode) in BinaryLog.COLUMNS:
+                size = n * array(typecode).itemsize
+                chunk[name] = read_column(f.read(size), typecode, n)
+            yield chunk
+    finally:
+        f.close()
+
+
+def load_log(file_name):
+    """
+    Loads all records of a binary log file
+    :param file_name: name of the log file
+    :returns: a dictionary mapping column names (time, src, dst, event, size)
+    to numpy arrays, or to arrays if numpy is not installed
+    """
+    chunks = dict((name, []) for (name, typecode) in BinaryLog.COLUMNS)
+    for chunk in iter_chunks(file_name):
+        for name in chunks:
+            chunks[name].append(chunk[name])
+    columns = {}
+    for (name, typecode) in BinaryLog.COLUMNS:
+        if numpy is not None:
+            columns[name] = numpy.concatenate(
+                chunks[name] + [numpy.zeros(0, dtype=typecode)])
+        else:
+            columns[name] = array(typecode)
+            for chunk in chunks[name]:
+                columns[name].extend(chunk)
+    return columns
@@ -16,54 +16,214 @@
 
 
 from optparse import OptionParser
+import itertools
+import multiprocessing
 import sys
 import sim
 
-# setup command line parameters
-parser = OptionParser(usage="usage: %prog [options]",
-                      description="Runs a simulation configured in the "
-                                  "specified config file under the specified "
-                                  "section")
-parser.add_option("-l", "--list", dest="list", default=False,
-                  action="store_true", help="list the available runs and exit")
-parser.add_option("-L", "--LIST", dest="verbose_list", default=False,
-                  action="store_true", help="list the available runs with "
-                                            "simulation parameters and exit")
-parser.add_option("-r", "--run", dest="run", default=0, action="store",
-                  help="run simulation number RUN [default: %default]",
-                  metavar="RUN", type="int")
-parser.add_option("-c", "--config", dest="config", default="config.json",
-                  action="store",
-                  help="simulation config file [default: %default]")
-parser.add_option("-o", "--outdir", dest="outdir", default=".",
-                  action="store",
-                  help="output directory [default: %default]")
-parser.add_option("-s", "--section", dest="section", default="simulation",
-                  action="store",
-                  help="section inside configuration file [default: %default]")
-
-# parse options
-(options, args) = parser.parse_args()
-
-if options.config == "" or options.section == "":
-    print("Required parameters config and section missing")
-    print(parser.get_usage())
-    sys.exit(1)
-
-simulator = sim.Sim.Instance()
-simulator.set_config(options.config, options.section, options.outdir)
-
-# list simulation runs and exit
-if options.list or options.verbose_list:
-    runs_count = simulator.get_runs_count()
-    for i in range(runs_count):
-        if options.list:
-            print("./main.py -c %s -s %s -r %d" %
-                (options.config, options.section, i))
+
+def parse_runs(runs):
+    """
+    Parses a list of runs given on the command line
+    :param runs: comma separated list of run numbers or ranges of run numbers
+    such as 0-167, where both ends are included
+    :returns: the list of run numbers
+    """
+    numbers = []
+    try:
+        for r in runs.split(","):
+            if "-" in r:
+                (first, last) = r.split("-")
+                numbers.extend(range(int(first), int(last) + 1))
+            else:
+                numbers.append(int(r))
+    except ValueError:
+        sys.stderr.write("Invalid list of runs: %s\n" % runs)
+        sys.exit(1)
+    return numbers
+
+
+def parse_shard(shard):
+    """
+    Parses a shard given on the command line
+    :param shard: string i/n, selecting the i-th of every n runs, with i going
+    from 0 to n - 1
+    :returns: the (i, n) pair
+    """
+    try:
+        (i, n) = [int(x) for x in shard.split("/")]
+    except ValueError:
+        sys.stderr.write("Invalid shard: %s\n" % shard)
+        sys.exit(1)
+    if n <= 0 or i < 0 or i >= n:
+        sys.stderr.write("Invalid shard: %s\n" % shard)
+        sys.exit(1)
+    return (i, n)
+
+
+def init_worker(config, section, outdir, profile):
+    """
+    Configures the simulator of a worker process. The simulator is reused for
+    all the runs executed by the worker
+    """
+    simulator = sim.Sim.Instance()
+    simulator.set_config(config, section, outdir)
+    simulator.set_profile(profile)
+    simulator.set_verbose(True)
+
+
+def run_worker(run):
+    """
+    Executes a simulation run within a worker process
+    :param run: the run number
+    """
+    simulator = sim.Sim.Instance()
+    simulator.initialize(run)
+    simulator.run()
+    sys.stdout.flush()
+
+
+def main():
+    # setup command line parameters
+    parser = OptionParser(usage="usage: %prog [options]",
+                          description="Runs a simulation configured in the "
+                                      "specified config file under the "
+                                      "specified section")
+    parser.add_option("-l", "--list", dest="list", default=False,
+                      action="store_true",
+                      help="list the available runs and exit")
+    parser.add_option("-L", "--LIST", dest="verbose_list", default=False,
+                      action="store_true",
+                      help="list the available runs with simulation "
+                           "parameters and exit")
+    parser.add_option("-r", "--run", dest="run", default=0, action="store",
+                      help="run simulation number RUN [default: %default]",
+                      metavar="RUN", type="int")
+    parser.add_option("-R", "--runs", dest="runs", default="", action="store",
+                      help="run several simulations in the same process, "
+                           "e.g., 0-167 or 0,5,10-20", metavar="RUNS")
+    parser.add_option("-j", "--jobs", dest="jobs", default=1, action="store",
+                      help="number of processes executing the runs selected "
+                           "with --runs, --shard or --where, or the "
+                           "replications forked with --replications "
+                           "[default: %default]", metavar="JOBS",
+                      type="int")
+    parser.add_option("-S", "--shard", dest="shard", default="",
+                      action="store",
+                      help="only consider the i-th of every n runs, given as "
+                           "i/n with i from 0 to n - 1", metavar="SHARD")
+    parser.add_option("-w", "--where", dest="where", default=[],
+                      action="append",
+                      help="only consider runs with the given parameter "
+                           "value, e.g., maxslots=500 or "
+                           "interarrival.lambda=800. can be repeated",
+                      metavar="FILTER")
+    parser.add_option("-p", "--profile", dest="profile", default=False,
+                      action="store_true",
+                      help="measure the cost of events and transitions, "
+                           "saving a report in a .profile.json file next to "
+                           "the output file. checkpoints must be disabled")
+    parser.add_option("-n", "--replications", dest="replications",
+                      default=0, action="store", type="int",
+                      help="simulate the run selected with --run up to the "
+                           "warm-up time, then fork this number of "
+                           "replications continuing it with different seeds",
+                      metavar="N")
+    parser.add_option("-W", "--warmup", dest="warmup", default=0.0,
+                      action="store", type="float",
+                      help="warm-up time in seconds shared by the "
+                           "replications [default: %default]", metavar="TIME")
+    parser.add_option("--resume", dest="resume", default="", action="store",
+                      help="continue the run saved in a checkpoint file. "
+                           "checkpoints are enabled with the checkpoint and "
+                           "checkpointwall parameters", metavar="CHECKPOINT")
+    parser.add_option("-c", "--config", dest="config", default="config.json",
+                      action="store",
+                      help="simulation config file [default: %default]")
+    parser.add_option("-o", "--outdir", dest="outdir", default=".",
+                      action="store",
+                      help="output directory [default: %default]")
+    parser.add_option("-s", "--section", dest="section", default="simulation",
+                      action="store",
+                      help="section inside configuration file "
+                           "[default: %default]")
+
+    # parse options
+    (options, args) = parser.parse_args()
+
+    if options.config == "" or options.section == "":
+        print("Required parameters config and section missing")
+        print(parser.get_usage())
+        sys.exit(1)
+
+    simulator = sim.Sim.Instance()
+    simulator.set_verbose(True)
+    if options.resume != "":
+        # config file, section and run number are taken from the checkpoint
+        simulator.resume(options.resume)
+        simulator.run()
+        sys.exit(0)
+    simulator.set_config(options.config, options.section, options.outdir)
+    simulator.set_profile(options.profile)
+
+    # select the runs to consider. runs are enumerated lazily, so that huge
+    # sweeps can be listed or sharded without going through all the runs
+    config = simulator.config
+    filters = config.parse_filters(options.where)
+    shard = None
+    if options.shard != "":
+        shard = parse_shard(options.shard)
+    if options.runs != "":
+        runs = parse_runs(options.runs)
+        runs_count = simulator.get_runs_count()
+        for r in runs:
+            if r < 0 or r >= runs_count:
+                sys.stderr.write("Simulation error. Run number %d does not "
+                                 "exist. Please run the simulator with the "
+                                 "--list option to list all possible runs\n"
+                                 % r)
+                sys.exit(1)
+        runs = (r for r in runs if config.matches(r, filters))
+        if shard is not None:
+            runs = itertools.islice(runs, shard[0], None, shard[1])
+    else:
+        runs = config.iter_runs(filters, shard)
+
+    # list simulation runs and exit
+    if options.list or options.verbose_list:
+        for i in runs:
+            if options.list:
+                print("./main.py -c %s -s %s -r %d" %
+                    (options.config, options.section, i))
+            else:
+                print("./main.py -c %s -s %s -r %d: %s" %
+                    (options.config, options.section, i,
+                     simulator.get_params(i)))
+        sys.exit(0)
+
+    if options.runs != "" or len(filters) > 0 or shard is not None:
+        if options.jobs > 1:
+            # each worker executes many runs, reusing its interpreter and
+            # its simulator instance
+            pool = multiprocessing.Pool(options.jobs, init_worker,
+                                        (options.config, options.section,
+                                         options.outdir, options.profile))
+            for r in pool.imap(run_worker, runs, chunksize=1):
+                pass
+            pool.close()
+            pool.join()
         else:
-            print("./main.py -c %s -s %s -r %d: %s" %
-                (options.config, options.section, i, simulator.get_params(i)))
-    sys.exit(0)
+            for r in runs:
+                run_worker(r)
+        sys.exit(0)
+
+    simulator.initialize(options.run)
+    simulator.run(options.replications, options.warmup, options.jobs)
+
 
-simulator.initialize(options.run)
-simulator.run()
+if __name__ == "__main__":
+    try:
+        main()
+    except sim.SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
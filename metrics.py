@@ -0,0 +1,201 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import json
+from packet import Packet
+
+
+class Metrics:
+    """
+    Computes the performance metrics of a run while the simulation goes on,
+    using the records passed to the logger, so that there is no need to write
+    and parse the whole trace afterwards. Metrics are the same as computed by
+    process.R: delivery rate (dr), collision rate (cr), throughput (th) and
+    mean packet size (sz). In addition, received and corrupted packets are
+    counted for each link, and the time-weighted mean queue length, the mean
+    queueing delay, the maximum queue length and the memory used by the queue
+    are computed for each node. Each update is O(1). Metrics that are undefined for a run
+    differ from process.R: dr and sz are 0.0 when no packet is generated (or
+    dr with a single node), and th is 0.0 when no time has elapsed, where R
+    gives NaN or Inf. This keeps the summary valid JSON, which jsonlite can
+    read in process.R
+    """
+
+    # record types, duplicated from Log to avoid a circular import
+    RECEIVED = Packet.PKT_RECEIVED
+    CORRUPTED = Packet.PKT_CORRUPTED
+    GENERATED = Packet.PKT_CORRUPTED + 1
+    QUEUE_DROPPED = GENERATED + 1
+
+    def __init__(self, start_time=0.0):
+        """
+        Constructor
+        :param start_time: time from which the metrics are computed, e.g.,
+        the end of the warm-up for forked replications
+        """
+        self.start_time = start_time
+        # number of packets generated, dropped, received and corrupted
+        self.generated = 0
+        self.dropped = 0
+        self.received = 0
+        self.corrupted = 0
+        # sum of the sizes of generated and received packets
+        self.generated_bytes = 0
+        self.received_bytes = 0
+        # time of the last record
+        self.last_time = 0
+        # map from (source, destination) to a list with the number of
+        # received and corrupted packets on the link
+        self.links = {}
+        # for each node id, queue length, time of its last change and
+        # integral of the queue length over time
+        self.queue_lengths = {}
+        self.queue_times = {}
+        self.queue_areas = {}
+        # for each node id, sum of the queueing delays of the transmitted
+        # packets and number of transmitted packets
+        self.queue_delays = {}
+        self.queue_departures = {}
+        # for each node id, maximum length of the queue and memory used by it
+        self.high_water = {}
+        self.queue_memory = {}
+
+    def record(self, time, src, dst, event, size):
+        """
+        Updates the metrics with a record passed to the logger. Parameters are
+        the same as for Log.write_record()
+        """
+        self.last_time = time
+        if event == Metrics.RECEIVED or event == Metrics.CORRUPTED:
+            link = self.links.get((src, dst))
+            if link is None:
+                link = [0, 0]
+                self.links[(src, dst)] = link
+            if event == Metrics.RECEIVED:
+                self.received = self.received + 1
+                self.received_bytes = self.received_bytes + int(size)
+                link[0] = link[0] + 1
+            else:
+                self.corrupted = self.corrupted + 1
+                link[1] = link[1] + 1
+        elif event == Metrics.GENERATED:
+            self.generated = self.generated + 1
+            self.generated_bytes = self.generated_bytes + int(size)
+        elif event == Metrics.QUEUE_DROPPED:
+            self.dropped = self.dropped + 1
+
+    def queue_length(self, time, node_id, length):
+        """
+        Updates the integral of the queue length of a node. Must be called
+        every time the length changes
+        :param time: current simulation time
+        :param node_id: id of the node
+        :param length: new length of the queue
+        """
+        if node_id in self.queue_lengths:
+            self.queue_areas[node_id] = self.queue_areas[node_id] + \
+                self.queue_lengths[node_id] * \
+                (time - self.queue_times[node_id])
+        else:
+            self.queue_areas[node_id] = 0.0
+        self.queue_lengths[node_id] = length
+        self.queue_times[node_id] = time
+
+    def queue_delay(self, node_id, delay):
+        """
+        Accounts for the time a packet spent in the queue of a node. Must be
+        called when the packet leaves the queue
+        :param node_id: id of the node
+        :param delay: time between the arrival of the packet in the queue and
+        the start of its transmission
+        """
+        self.queue_delays[node_id] = self.queue_delays.get(node_id, 0.0) + \
+            delay
+        self.queue_departures[node_id] = \
+            self.queue_departures.get(node_id, 0) + 1
+
+    def queue_stats(self, node_id, high_water, memory):
+        """
+        Stores the final statistics of the queue of a node
+        :param node_id: id of the node
+        :param high_water: maximum length reached by the queue
+        :param memory: memory used by the queue, in bytes
+        """
+        self.high_water[node_id] = high_water
+        self.queue_memory[node_id] = memory
+
+    def get_summary(self, end_time, nodes_count):
+        """
+        Computes the metrics of the run
+        :param end_time: time at which the simulation stopped, used to close
+        the queue length integrals
+        :param nodes_count: number of nodes in the simulation
+        :returns: a dictionary with the metrics
+        """
+        summary = {
+            "nodes": nodes_count,
+            "generated": self.generated,
+            "dropped": self.dropped,
+            "received": self.received,
+            "corrupted": self.corrupted,
+            "time": self.last_time,
+            "start": self.start_time,
+            "dr": 0.0,
+            "cr": 0.0,
+            "th": 0.0,
+            "sz": 0.0
+        }
+        # undefined metrics are left to 0.0 rather than NaN, see the class
+        if self.generated > 0 and nodes_count > 1:
+            summary["dr"] = float(self.received) / \
+                (self.generated * (nodes_count - 1))
+            summary["sz"] = float(self.generated_bytes) / self.generated
+        if self.received + self.corrupted > 0:
+            summary["cr"] = float(self.corrupted) / \
+                (self.received + self.corrupted)
+        if self.last_time > self.start_time:
+            summary["th"] = self.received_bytes / \
+                (self.last_time - self.start_time)
+        # links as a list of [source, destination, received, corrupted]
+        summary["links"] = [[k[0], k[1], v[0], v[1]]
+                            for k, v in sorted(self.links.items())]
+        # time-weighted mean queue length of each node
+        queues = {}
+        for node_id, length in self.queue_lengths.items():
+            area = self.queue_areas[node_id] + \
+                length * (end_time - self.queue_times[node_id])
+            duration = end_time - self.start_time
+            queues[str(node_id)] = area / duration if duration > 0 else 0.0
+        summary["queue"] = queues
+        # mean queueing delay, maximum queue length and queue memory of each
+        # node
+        summary["delay"] = dict((str(k), v / self.queue_departures[k])
+                                for k, v in self.queue_delays.items())
+        summary["high_water"] = dict((str(k), v)
+                                     for k, v in self.high_water.items())
+        summary["queue_memory"] = dict((str(k), v)
+                                       for k, v in self.queue_memory.items())
+        return summary
+
+    def save(self, file_name, end_time, nodes_count):
+        """
+        Writes the metrics of the run to a JSON file
+        :param file_name: name of the output file
+        :param end_time: see get_summary()
+        :param nodes_count: see get_summary()
+        """
+        with open(file_name, "w") as f:
+            json.dump(self.get_summary(end_time, nodes_count), f, indent=4,
+                      sort_keys=True)
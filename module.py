@@ -1,5 +1,5 @@
-import sys
 import sim
+from errors import SimulationError
 
 
 class Module:
@@ -8,10 +8,6 @@ class Module:
     that all modules should inherit from
     """
 
-    # static class variable automatically incremented everytime a new module is
-    # instantiated
-    __modules_count = 0
-
     def __init__(self):
         """
         Constructor. Gets simulation instance for scheduling events and
@@ -19,8 +15,7 @@ class Module:
         """
         self.sim = sim.Sim.Instance()
         # auto assign module id
-        self.module_id = Module.__modules_count
-        Module.__modules_count = Module.__modules_count + 1
+        self.module_id = self.sim.next_module_id()
         # get data logger from simulator
         self.logger = self.sim.get_logger()
 
@@ -37,9 +32,8 @@ class Module:
         events for this module. If not overridden, this method will throw an
         error and stop the simulation
         """
-        print("Module error: class %s does not override handle_event() method",
-              self.get_type())
-        sys.exit(1)
+        raise SimulationError("Module error: class %s does not override "
+                              "handle_event() method" % self.get_type())
 
     def get_id(self):
         """
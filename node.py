@@ -15,7 +15,6 @@
 
 
 from fsmNode import FSMNode
-from event import Event
 from events import Events
 from packet import Packet
 
@@ -61,19 +60,20 @@ class Node(FSMNode):
             # Set the receiving packet as corrupted by another one
             (Node.RX, Events.START_RX): self.corrupt_reception,
 
-            # The node is busy, new packets detected in the air are dropped
-            (Node.PROC, Events.START_RX): self.drop_receiving,
-            (Node.TX, Events.START_RX): self.drop_receiving,
-            (Node.SENSE, Events.START_RX): self.drop_receiving,
+            # The node is busy, new packets detected in the air are dropped.
+            # The channel does not even notify the node about them
+            (Node.PROC, Events.START_RX): self.stay,
+            (Node.TX, Events.START_RX): self.stay,
+            (Node.SENSE, Events.START_RX): self.stay,
 
             # Stop waiting for slot and go back to sense until ch is free again
             (Node.WAIT_SLOT, Events.START_RX): self.giveup_and_sense,
 
-            # Detect the termination of a packet in the air and
-            # remain in the same state
-            (Node.IDLE, Events.END_RX): self.end_packet,
-            (Node.PROC, Events.END_RX): self.end_packet,
-            (Node.TX, Events.END_RX): self.end_packet,
+            # The termination of a packet in the air does not change the
+            # state. The channel does not even notify the node about it
+            (Node.IDLE, Events.END_RX): self.stay,
+            (Node.PROC, Events.END_RX): self.stay,
+            (Node.TX, Events.END_RX): self.stay,
 
             # Retry transmitting when a packet in the air terminates
             (Node.SENSE, Events.END_RX): self.retry_transmitting,
@@ -90,12 +90,9 @@ class Node(FSMNode):
             (Node.WAIT_SLOT, Events.END_SLOT): self.slot_ended
         })
 
-        # current packet being received
+        # reception record of the current packet being received
         self.current_rcv = None
 
-        # count packets currently detected on channel
-        self.packets_on_ch = 0
-
     def try_transmitting(self, event=None):
         """
         If the channel is not free go in SENSE state,
@@ -107,20 +104,18 @@ class Node(FSMNode):
         return self.wait_for_slot()
 
     def retry_transmitting(self, event=None):
-        # count packet not in the channel anymore
-        self.sense_packet_end()
         return self.try_transmitting()
 
     def wait_for_slot(self, event=None):
         slot_num = self.slots.get_value()
         slot_time = slot_num * self.slot_duration
-        self.end_slot = Event(self.sim.get_time() + slot_time, Events.END_SLOT,
-                              self, self)
-        self.sim.schedule_event(self.end_slot)
+        end_slot = self.sim.new_event(self.sim.get_time() + slot_time,
+                                      Events.END_SLOT, self, self)
+        # keep the handle to cancel the event if the channel becomes busy
+        self.end_slot = self.sim.schedule_event(end_slot)
         return Node.WAIT_SLOT
 
     def giveup_and_sense(self, event):
-        self.drop_receiving(event)
         self.sim.cancel_event(self.end_slot)
         return Node.SENSE
 
@@ -129,62 +124,45 @@ class Node(FSMNode):
         return Node.TX
 
     def try_receiving(self, event):
-        was_channel_free = self.is_channel_free()
-
-        # count new packet in the channel
-        self.sense_packet_start()
+        # the channel already counts the new packet
+        was_channel_free = self.channel.count_transmissions(self) == 1
 
-        new_packet = event.get_obj()
+        # reception record of the new packet at this node
+        new_rcv = event.get_obj()
 
         # If there are other packets on the channel, they will interfere with
         # this one, so set it to corrupted and don't try to receive it
         if not was_channel_free:
-            new_packet.set_state(Packet.PKT_CORRUPTED)
+            new_rcv.set_state(Packet.PKT_CORRUPTED)
             return FSMNode.STAY
 
         # Start receiving this packet
-        self.current_rcv = new_packet
+        self.current_rcv = new_rcv
         self.current_rcv.set_state(Packet.PKT_RECEIVING)
         return Node.RX
 
     def corrupt_reception(self, event):
-        # count new packet in the channel
-        self.sense_packet_start()
-
         # the packet we are currently receiving is corrupted by a
         # collision with the new packet
         self.current_rcv.set_state(Packet.PKT_CORRUPTED)
 
         # Also the new packet is corrupted
-        new_packet = event.get_obj()
-        new_packet.set_state(Packet.PKT_CORRUPTED)
+        new_rcv = event.get_obj()
+        new_rcv.set_state(Packet.PKT_CORRUPTED)
 
         # Stay anyway in RX until the end event
         return FSMNode.STAY
 
-    def drop_receiving(self, event):
-        # count new packet in the channel
-        self.sense_packet_start()
-
-        packet = event.get_obj()
-
-        # If the node is not in IDLE or RX, it is not able to decode a new
-        # packet so just ignore it and remain in same state
-        return FSMNode.STAY
-
     def end_receiving(self, event):
-        # count packet not in the channel anymore
-        self.sense_packet_end()
-
-        packet = event.get_obj()
+        reception = event.get_obj()
 
         # The packet is the one under reception
-        if packet.get_id() == self.current_rcv.get_id():
+        if reception is self.current_rcv:
             # the packet is not corrupted, so it is successfully received
-            if packet.get_state() == Packet.PKT_RECEIVING:
-                packet.set_state(Packet.PKT_RECEIVED)
+            if reception.get_state() == Packet.PKT_RECEIVING:
+                reception.set_state(Packet.PKT_RECEIVED)
 
-            self.logger.log_packet(event.get_source(), self, packet)
+            self.logger.log_packet(event.get_source(), self, reception)
 
             self.current_rcv = None
 
@@ -193,16 +171,10 @@ class Node(FSMNode):
 
         # The packet is not the one under reception, so it should have
         # already been marked as corrupted on its start event
-        assert(packet.get_state() == Packet.PKT_CORRUPTED)
+        assert(reception.get_state() == Packet.PKT_CORRUPTED)
 
         # Just log it and stay in the same state
-        self.logger.log_packet(event.get_source(), self, packet)
-        return FSMNode.STAY
-
-    def end_packet(self, event):
-        # count packet not in the channel anymore and stay in the same state
-        self.sense_packet_end()
-
+        self.logger.log_packet(event.get_source(), self, reception)
         return FSMNode.STAY
 
     def switch_to_proc(self, event):
@@ -210,8 +182,8 @@ class Node(FSMNode):
         Switches to the processing state and schedules the end_proc event
         """
         proc_time = self.proc_time.get_value()
-        proc = Event(self.sim.get_time() + proc_time, Events.END_PROC, self,
-                     self)
+        proc = self.sim.new_event(self.sim.get_time() + proc_time,
+                                  Events.END_PROC, self, self)
         self.sim.schedule_event(proc)
         return Node.PROC
 
@@ -228,10 +200,4 @@ class Node(FSMNode):
             return self.try_transmitting()
 
     def is_channel_free(self):
-        return self.packets_on_ch == 0
-
-    def sense_packet_start(self):
-        self.packets_on_ch = self.packets_on_ch + 1
-
-    def sense_packet_end(self):
-        self.packets_on_ch = self.packets_on_ch - 1
+        return self.channel.count_transmissions(self) == 0
@@ -14,15 +14,17 @@
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
 
-class Packet:
+class Packet(object):
     """
-    Class defining a packet to be associated with a transmission event
+    Class defining a packet to be associated with a transmission event. A
+    packet is never modified after its creation, so that a single instance can
+    be shared by all the receivers of a broadcast transmission. The outcome of
+    the reception at each receiver is stored in a Reception instead
     """
 
-    # used to create a unique ID for the packet
-    __packets_count = 0
+    __slots__ = ["size", "duration", "id"]
 
-    # possible packet states
+    # possible reception states
     # packet currently under reception
     PKT_RECEIVING = 0
     # packet has been correctly received
@@ -30,17 +32,16 @@ class Packet:
     # packet has been corrupted due to, for example, a collision
     PKT_CORRUPTED = 2
 
-    def __init__(self, size, duration):
+    def __init__(self, size, duration, packet_id):
         """
-        Creates a packet automatically assigning a unique ID to it
+        Creates a packet
         :param size: size of the packet in bytes
         :param duration: packet duration in seconds
+        :param packet_id: unique id of the packet, see Sim.next_packet_id()
         """
         self.size = size
         self.duration = duration
-        self.state = Packet.PKT_RECEIVING
-        self.id = Packet.__packets_count
-        Packet.__packets_count = Packet.__packets_count + 1
+        self.id = packet_id
 
     def get_id(self):
         """
@@ -49,37 +50,82 @@ class Packet:
         """
         return self.id
 
-    def get_state(self):
+    def get_size(self):
         """
-        Returns state of a packet
-        :returns: state of the packet
+        Returns packet size
+        :returns: packet size in bytes
         """
-        return self.state
+        return self.size
 
-    def set_state(self, state):
+    def get_duration(self):
         """
-        Sets packet state.
-        :param state: either PKT_RECEIVING, PKT_RECEIVED, or PKT_CORRUPTED
+        Returns packet duration
+        :returns: packet duration in seconds
         """
-        self.state = state
+        return self.duration
+
+
+class Reception(object):
+    """
+    Class defining the state of the reception of a packet at a specific
+    receiver
+    """
+
+    __slots__ = ["packet", "state"]
+
+    def __init__(self, packet):
+        """
+        Creates a reception record for a packet, initially under reception
+        :param packet: the packet being received, shared with other receivers
+        """
+        self.packet = packet
+        self.state = Packet.PKT_RECEIVING
+
+    def get_packet(self):
+        """
+        Returns the packet being received
+        :returns: the shared packet instance
+        """
+        return self.packet
+
+    def get_id(self):
+        """
+        Returns the id of the packet being received
+        :returns: id of the packet
+        """
+        return self.packet.id
 
     def get_size(self):
         """
-        Returns packet size
+        Returns the size of the packet being received
         :returns: packet size in bytes
         """
-        return self.size
+        return self.packet.size
 
     def get_duration(self):
         """
-        Returns packet duration
+        Returns the duration of the packet being received
         :returns: packet duration in seconds
         """
-        return self.duration
+        return self.packet.duration
+
+    def get_state(self):
+        """
+        Returns state of the reception
+        :returns: state of the reception
+        """
+        return self.state
+
+    def set_state(self, state):
+        """
+        Sets reception state.
+        :param state: either PKT_RECEIVING, PKT_RECEIVED, or PKT_CORRUPTED
+        """
+        self.state = state
 
-    def dump_packet(self):
+    def dump_reception(self):
         """
-        Prints the packet in a human readable format
+        Prints the reception in a human readable format
         """
         if self.state == Packet.PKT_RECEIVING:
             t = "UNDER RECEPTION"
@@ -0,0 +1,134 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from array import array
+import sys
+from errors import SimulationError
+
+
+class PacketQueue(object):
+    """
+    FIFO queue of packets waiting to be transmitted by a node, implemented as a
+    ring buffer. For each packet the queue stores its size and its arrival
+    time in two typed arrays, so that enqueuing and dequeuing are O(1) and each
+    packet takes 16 bytes instead of a reference to a Python float. When the
+    buffer is full its capacity is doubled, up to the maximum queue size
+    """
+
+    __slots__ = ["sizes", "arrivals", "head", "count", "capacity",
+                 "max_size", "high_water"]
+
+    # initial capacity of the buffer
+    INITIAL_CAPACITY = 16
+
+    def __init__(self, max_size=0):
+        """
+        Constructor
+        :param max_size: maximum number of packets in the queue. 0 means
+        infinite
+        """
+        self.max_size = max_size
+        self.capacity = self.INITIAL_CAPACITY
+        if max_size > 0:
+            self.capacity = min(self.capacity, max_size)
+        # packet sizes in bytes and arrival times in seconds
+        self.sizes = array("d", [0]) * self.capacity
+        self.arrivals = array("d", [0]) * self.capacity
+        # index of the first packet in the buffer
+        self.head = 0
+        # number of packets in the queue
+        self.count = 0
+        # maximum number of packets ever in the queue
+        self.high_water = 0
+
+    def is_full(self):
+        """
+        Tells whether the queue has reached its maximum size
+        """
+        return self.max_size != 0 and self.count >= self.max_size
+
+    def append(self, size, arrival):
+        """
+        Adds a packet at the end of the queue. The queue must not be full
+        :param size: size of the packet in bytes
+        :param arrival: arrival time of the packet
+        """
+        if self.count == self.capacity:
+            self.grow()
+        tail = self.head + self.count
+        if tail >= self.capacity:
+            tail = tail - self.capacity
+        self.sizes[tail] = size
+        self.arrivals[tail] = arrival
+        self.count = self.count + 1
+        if self.count > self.high_water:
+            self.high_water = self.count
+
+    def pop(self):
+        """
+        Removes the first packet from the queue. The queue must not be empty
+        :returns: the size of the packet in bytes
+        """
+        size = self.sizes[self.head]
+        self.head = self.head + 1
+        if self.head == self.capacity:
+            self.head = 0
+        self.count = self.count - 1
+        return size
+
+    def get_arrival(self):
+        """
+        Returns the arrival time of the first packet in the queue. The queue
+        must not be empty
+        """
+        return self.arrivals[self.head]
+
+    def grow(self):
+        """
+        Doubles the capacity of the buffer, without exceeding the maximum size
+        of the queue. Packets are moved to the beginning of the new buffer
+        """
+        capacity = 2 * self.capacity
+        if self.max_size > 0:
+            capacity = min(capacity, self.max_size)
+        if capacity <= self.capacity:
+            raise SimulationError("Queue error: appending a packet to a "
+                                  "full queue")
+        head = self.head
+        sizes = self.sizes[head:] + self.sizes[:head]
+        arrivals = self.arrivals[head:] + self.arrivals[:head]
+        padding = capacity - self.capacity
+        sizes.extend(array("d", [0]) * padding)
+        arrivals.extend(array("d", [0]) * padding)
+        self.sizes = sizes
+        self.arrivals = arrivals
+        self.head = 0
+        self.capacity = capacity
+
+    def get_high_water(self):
+        """
+        Returns the maximum number of packets that have been in the queue
+        """
+        return self.high_water
+
+    def get_memory(self):
+        """
+        Returns the memory used by the queue in bytes, including the buffers
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self.sizes) + \
+            sys.getsizeof(self.arrivals)
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,149 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from array import array
+import ast
+import struct
+import sys
+from errors import SimulationError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class PositionFile:
+    """
+    Positions of the nodes stored in a .npy file, as an array of shape (N, 2)
+    with the x and y coordinates of each node. With numpy, the file is memory
+    mapped. Otherwise, its header is parsed here and the values are read
+    with the array module. In both cases, positions are converted to python
+    floats a chunk at a time while iterating, so the whole topology is never
+    turned into python lists
+    """
+
+    # first bytes of a .npy file
+    MAGIC = b"\x93NUMPY"
+    # number of positions converted at once
+    CHUNK_SIZE = 65536
+    # map from the type of the values in a .npy file to array typecodes
+    TYPECODES = {"f8": "d", "f4": "f", "i4": "i"}
+
+    def __init__(self, file_name):
+        """
+        Constructor. Raises an error if the file cannot be read or does not
+        contain an array of positions
+        :param file_name: name of the .npy file
+        """
+        self.file_name = file_name
+        try:
+            if numpy is not None:
+                self.values = numpy.load(file_name, mmap_mode="r")
+                shape = self.values.shape
+            else:
+                self.values = None
+                shape = self.read_header()
+        except (IOError, OSError, ValueError) as e:
+            self.error(str(e))
+        if len(shape) != 2 or shape[1] != 2:
+            self.error("expected an array of shape (N, 2), found %s" %
+                       str(shape))
+        self.count = shape[0]
+
+    def error(self, message):
+        """
+        Raises an error about the file
+        :param message: description of the error
+        """
+        raise SimulationError("Configuration error: cannot load node "
+                              "positions from %s: %s" %
+                              (self.file_name, message))
+
+    def read_header(self):
+        """
+        Parses the header of the .npy file, for when numpy is not installed.
+        Raises an error if the header is corrupted
+        :returns: the shape of the array
+        """
+        with open(self.file_name, "rb") as f:
+            if f.read(len(PositionFile.MAGIC)) != PositionFile.MAGIC:
+                self.error("not a .npy file")
+            try:
+                (major, minor) = struct.unpack("<BB", f.read(2))
+                if major == 1:
+                    length = struct.unpack("<H", f.read(2))[0]
+                else:
+                    length = struct.unpack("<I", f.read(4))[0]
+                header = ast.literal_eval(f.read(length).decode("latin1"))
+                descr = header["descr"]
+                if descr[1:] not in PositionFile.TYPECODES or \
+                   descr[0] not in "<|=":
+                    self.error("unsupported type %s" % descr)
+                self.typecode = PositionFile.TYPECODES[descr[1:]]
+                self.fortran_order = header["fortran_order"]
+                shape = tuple(int(n) for n in header["shape"])
+            except KeyError as e:
+                self.error("corrupted header, %s is missing" % str(e))
+            except (struct.error, SyntaxError, ValueError, TypeError,
+                    IndexError) as e:
+                self.error("corrupted header, %s" % str(e))
+            self.offset = f.tell()
+        return shape
+
+    def __len__(self):
+        """
+        Returns the number of positions
+        """
+        return self.count
+
+    def __iter__(self):
+        """
+        Iterates over the positions
+        :returns: a generator of (x, y) pairs of floats
+        """
+        if self.values is not None:
+            for start in range(0, self.count, PositionFile.CHUNK_SIZE):
+                chunk = self.values[start:start + PositionFile.CHUNK_SIZE]
+                for (x, y) in chunk.tolist():
+                    yield (x, y)
+            return
+        if self.fortran_order:
+            # all x coordinates are stored before all y coordinates
+            xs = self.read_values(0, self.count)
+            ys = self.read_values(self.count, self.count)
+            for i in range(self.count):
+                yield (float(xs[i]), float(ys[i]))
+            return
+        for start in range(0, self.count, PositionFile.CHUNK_SIZE):
+            n = min(PositionFile.CHUNK_SIZE, self.count - start)
+            values = self.read_values(2 * start, 2 * n)
+            for i in range(n):
+                yield (float(values[2 * i]), float(values[2 * i + 1]))
+
+    def read_values(self, start, n):
+        """
+        Reads values from the file, for when numpy is not installed
+        :param start: index of the first value
+        :param n: number of values to read
+        :returns: an array with the values
+        """
+        values = array(self.typecode)
+        with open(self.file_name, "rb") as f:
+            f.seek(self.offset + start * values.itemsize)
+            values.fromfile(f, n)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
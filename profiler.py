@@ -0,0 +1,165 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import json
+from timeit import default_timer
+from events import Events
+
+
+def get_names(cls):
+    """
+    Returns the names of the integer constants defined by a class
+    :param cls: the class
+    :returns: dictionary mapping values to names
+    """
+    return dict((v, k) for (k, v) in vars(cls).items()
+                if k.isupper() and isinstance(v, int))
+
+
+class Profiler:
+    """
+    Measures where the time of a run goes: number of events and wall-clock
+    time spent handling them for each event type, number of calls and time
+    for each transition (State, Event) -> action of the nodes, maximum size
+    of the queue of events and events processed per second. The simulator
+    only uses the profiler in a separate loop (see Sim.run()), so runs that
+    are not profiled pay nothing for it
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # map from event type to a list with the number of events and the
+        # time spent handling them
+        self.events = {}
+        # map from (node class, state, event type, action name) to a list
+        # with the number of calls and the time spent in the action
+        self.transitions = {}
+        # maximum number of events in the queue, cancelled ones excluded
+        self.queue_high_water = 0
+        # total number of events handled
+        self.events_count = 0
+        # wall-clock duration of the run and simulated time reached
+        self.wall_time = 0.0
+        self.sim_time = 0.0
+
+    def instrument(self, node):
+        """
+        Replaces the transition functions in the table of a node with
+        wrappers measuring their calls
+        :param node: the node, an instance of FSMNode
+        """
+        for state in range(len(node.table)):
+            row = node.table[state]
+            for event_type in range(len(row)):
+                action = row[event_type]
+                key = (node.__class__, state, event_type, action.__name__)
+                row[event_type] = self.wrap(action, key)
+
+    def wrap(self, action, key):
+        """
+        Returns a transition function calling the given one and accumulating
+        its calls and duration under key
+        :param action: the transition function
+        :param key: key of the transition in self.transitions
+        """
+        stats = self.transitions.setdefault(key, [0, 0.0])
+
+        def profiled(event):
+            start = default_timer()
+            next_state = action(event)
+            stats[0] = stats[0] + 1
+            stats[1] = stats[1] + default_timer() - start
+            return next_state
+        profiled.__name__ = action.__name__
+        return profiled
+
+    def event_handled(self, event_type, duration, queue_length):
+        """
+        Accounts for an event that has been handled
+        :param event_type: type of the event
+        :param duration: wall-clock time spent handling it
+        :param queue_length: number of events in the queue after handling it,
+        not counting the cancelled ones
+        """
+        stats = self.events.get(event_type)
+        if stats is None:
+            stats = [0, 0.0]
+            self.events[event_type] = stats
+        stats[0] = stats[0] + 1
+        stats[1] = stats[1] + duration
+        self.events_count = self.events_count + 1
+        if queue_length > self.queue_high_water:
+            self.queue_high_water = queue_length
+
+    def stop(self, wall_time, sim_time):
+        """
+        Records the end of the run
+        :param wall_time: wall-clock duration of the run
+        :param sim_time: simulated time reached
+        """
+        self.wall_time = wall_time
+        self.sim_time = sim_time
+
+    def get_report(self):
+        """
+        Returns the results of the profiling, with event types and states
+        given by name. Transitions that have never been called are omitted
+        """
+        event_names = get_names(Events)
+        events = {}
+        for event_type, (count, duration) in self.events.items():
+            events[event_names.get(event_type, str(event_type))] = {
+                "count": count,
+                "time": duration,
+                "mean": duration / count
+            }
+        transitions = []
+        for (cls, state, event_type, action), (count, duration) in \
+                self.transitions.items():
+            if count == 0:
+                continue
+            transitions.append({
+                "node": cls.__name__,
+                "state": get_names(cls).get(state, str(state)),
+                "event": event_names.get(event_type, str(event_type)),
+                "action": action,
+                "count": count,
+                "time": duration,
+                "mean": duration / count
+            })
+        # most expensive transitions first
+        transitions.sort(key=lambda t: -t["time"])
+        rate = 0.0
+        if self.wall_time > 0:
+            rate = self.events_count / self.wall_time
+        return {
+            "events": events,
+            "transitions": transitions,
+            "events_count": self.events_count,
+            "queue_high_water": self.queue_high_water,
+            "wall_time": self.wall_time,
+            "sim_time": self.sim_time,
+            "events_per_second": rate
+        }
+
+    def save(self, file_name):
+        """
+        Writes the results of the profiling to a JSON file
+        :param file_name: name of the output file
+        """
+        with open(file_name, "w") as f:
+            json.dump(self.get_report(), f, indent=4, sort_keys=True)
@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from optparse import OptionParser
+import json
+import math
+import multiprocessing
+import sys
+import traceback
+import sim
+from config import Config
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+# quantiles of the Student's t distribution for two-sided confidence
+# intervals, for 1 to 30 degrees of freedom
+T_QUANTILES = {
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833,
+           1.812, 1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734,
+           1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703,
+           1.701, 1.699, 1.697],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+           2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101,
+           2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
+           2.048, 2.045, 2.042],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250,
+           3.169, 3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878,
+           2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771,
+           2.763, 2.756, 2.750]
+}
+# quantiles for more than 30 degrees of freedom, as (degrees, quantile)
+# pairs. the quantile of the largest tabulated degrees not exceeding the
+# requested ones is used, which slightly widens the interval
+T_QUANTILES_TAIL = {
+    0.90: [(40, 1.684), (60, 1.671), (120, 1.658)],
+    0.95: [(40, 2.021), (60, 2.000), (120, 1.980)],
+    0.99: [(40, 2.704), (60, 2.660), (120, 2.617)]
+}
+
+
+def t_quantile(confidence, degrees):
+    """
+    Returns the quantile of the Student's t distribution used to compute a
+    two-sided confidence interval
+    :param confidence: confidence level, one of the keys of T_QUANTILES
+    :param degrees: degrees of freedom
+    """
+    if degrees <= len(T_QUANTILES[confidence]):
+        return T_QUANTILES[confidence][degrees - 1]
+    quantile = T_QUANTILES[confidence][-1]
+    for (d, q) in T_QUANTILES_TAIL[confidence]:
+        if d <= degrees:
+            quantile = q
+    return quantile
+
+
+class Estimate:
+    """
+    Running mean and variance of the values of a metric across replications,
+    updated with Welford's algorithm as results arrive
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.values = []
+
+    def add(self, value):
+        """
+        Adds the value obtained by a replication
+        :param value: the value of the metric
+        """
+        self.values.append(value)
+        self.count = self.count + 1
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+
+    def get_half_width(self, confidence):
+        """
+        Returns the half-width of the confidence interval of the mean, or
+        infinity if there are less than two values
+        :param confidence: the confidence level
+        """
+        if self.count < 2:
+            return float("inf")
+        variance = self.m2 / (self.count - 1)
+        return t_quantile(confidence, self.count - 1) * \
+            math.sqrt(variance / self.count)
+
+    def is_precise(self, confidence, precision):
+        """
+        Tells whether the half-width of the confidence interval is within the
+        given fraction of the mean
+        :param confidence: the confidence level
+        :param precision: maximum ratio between half-width and mean
+        """
+        return self.get_half_width(confidence) <= precision * abs(self.mean)
+
+
+class Point:
+    """
+    State of the replications of a parameter point, i.e., of the runs of the
+    config file that only differ by seed
+    """
+
+    def __init__(self, run, params, metrics):
+        """
+        Constructor
+        :param run: run number of the first replication of the point
+        :param params: the parameters of the point, seed excluded
+        :param metrics: names of the metrics to estimate
+        """
+        self.run = run
+        self.params = params
+        self.seeds = []
+        self.pending = 0
+        self.done = False
+        self.estimates = dict((m, Estimate()) for m in metrics)
+
+    def get_result(self, confidence):
+        """
+        Returns the estimates of the point as a dictionary
+        :param confidence: the confidence level
+        """
+        metrics = {}
+        for m, e in self.estimates.items():
+            metrics[m] = {"mean": e.mean,
+                          "halfwidth": e.get_half_width(confidence),
+                          "values": e.values}
+        return {"run": self.run, "params": self.params, "seeds": self.seeds,
+                "replications": len(self.seeds), "metrics": metrics}
+
+
+def init_worker(config, section, outdir):
+    """
+    Configures the simulator of a worker process
+    """
+    simulator = sim.Sim.Instance()
+    simulator.set_config(config, section, outdir)
+    simulator.set_verbose(True)
+
+
+def run_replication(run, seed):
+    """
+    Executes a replication of a parameter point with the given seed,
+    computing metrics during the simulation
+    :param run: a run number of the parameter point
+    :param seed: the seed of the replication
+    :returns: a (run, seed, summary) tuple, where summary is the dictionary
+    saved by Metrics
+    """
+    simulator = sim.Sim.Instance()
+    simulator.config.set_override(simulator.PAR_SEED, seed)
+    simulator.config.set_override(simulator.PAR_METRICS, True)
+    simulator.initialize(run)
+    simulator.run()
+    sys.stdout.flush()
+    with open(simulator.logger.summary_file) as f:
+        summary = json.load(f)
+    return (run, seed, summary)
+
+
+class ReplicationFailure:
+    """
+    Result of a replication that failed in a worker process, put on the
+    queue of completed replications in place of its summary
+    """
+
+    def __init__(self, run, seed, message):
+        """
+        Constructor
+        :param run: the run number of the parameter point
+        :param seed: the seed of the replication
+        :param message: description of the error
+        """
+        self.run = run
+        self.seed = seed
+        self.message = message
+
+    def __str__(self):
+        return "Replication of run %d with seed %d failed: %s" % \
+               (self.run, self.seed, self.message)
+
+
+def run_worker_replication(run, seed):
+    """
+    Executes a replication in a worker process. Errors, including exits, are
+    returned as a ReplicationFailure, as the pool would otherwise never
+    report the replication as completed
+    :returns: the tuple returned by run_replication() or a ReplicationFailure
+    """
+    try:
+        return run_replication(run, seed)
+    except sim.SimulationError as e:
+        message = str(e)
+    except SystemExit as e:
+        message = "exited with status %s" % e.code
+    except Exception:
+        message = traceback.format_exc()
+    sys.stderr.flush()
+    return ReplicationFailure(run, seed, message)
+
+
+def get_points(config, metrics):
+    """
+    Groups the runs of a config file section by parameter point
+    :param config: the Config instance
+    :param metrics: names of the metrics to estimate
+    :returns: list of (point, configured seeds) pairs, ordered by run number
+    """
+    seed_param = sim.Sim.Instance().PAR_SEED
+    points = {}
+    seeds = {}
+    for run in range(config.get_runs_count()):
+        config.set_run_number(run)
+        params = {}
+        for p in config.get_swept_params():
+            if p != seed_param:
+                params[p] = config.get_param(p)
+        key = json.dumps(params, sort_keys=True)
+        if key not in points:
+            points[key] = Point(run, params, metrics)
+            seeds[key] = []
+        seeds[key].append(config.get_param(seed_param))
+    return sorted([(points[k], seeds[k]) for k in points],
+                  key=lambda p: p[0].run)
+
+
+class Controller:
+    """
+    Launches the replications of all parameter points and decides, as their
+    results arrive, whether a point needs more of them
+    """
+
+    def __init__(self, points, options, submit):
+        """
+        Constructor
+        :param points: list returned by get_points()
+        :param options: command line options
+        :param submit: function executing a replication given its point and
+        its seed. the result of run_replication() must then be passed to
+        handle_result()
+        """
+        self.points = [p for (p, seeds) in points]
+        self.options = options
+        self.submit = submit
+        self.metrics = options.metrics.split(",")
+        # seeds still to be used for each point: first the configured ones,
+        # then new ones following the largest configured seed
+        self.seeds = dict((p.run, list(seeds)) for (p, seeds) in points)
+        self.next_seed = max(s for (p, seeds) in points for s in seeds) + 1
+        self.by_run = dict((p.run, p) for p in self.points)
+        # number of replications launched but not completed yet
+        self.running = 0
+
+    def launch(self, point):
+        """
+        Launches a new replication of a point
+        :param point: the point
+        """
+        if len(self.seeds[point.run]) > 0:
+            seed = self.seeds[point.run].pop(0)
+        else:
+            seed = self.next_seed
+            self.next_seed = self.next_seed + 1
+        point.seeds.append(seed)
+        point.pending = point.pending + 1
+        self.running = self.running + 1
+        self.submit(point, seed)
+
+    def start(self):
+        """
+        Launches the minimum number of replications of all points
+        """
+        for point in self.points:
+            for i in range(self.options.min):
+                self.launch(point)
+
+    def is_precise(self, point):
+        """
+        Tells whether the estimates of all metrics of a point are precise
+        enough
+        """
+        return all(point.estimates[m].is_precise(self.options.confidence,
+                                                 self.options.precision)
+                   for m in self.metrics)
+
+    def handle_result(self, result):
+        """
+        Merges the result of a replication into the estimates of its point,
+        launching another replication if they are not precise enough
+        :param result: the tuple returned by run_replication()
+        """
+        (run, seed, summary) = result
+        self.running = self.running - 1
+        point = self.by_run[run]
+        point.pending = point.pending - 1
+        for m in self.metrics:
+            point.estimates[m].add(summary[m])
+        if point.done:
+            return
+        count = len(point.seeds) - point.pending
+        if count >= self.options.min and self.is_precise(point):
+            point.done = True
+            print("Point %d converged after %d replications" % (run, count))
+        elif len(point.seeds) < self.options.max:
+            self.launch(point)
+        elif point.pending == 0:
+            point.done = True
+            print("Point %d reached %d replications without converging" %
+                  (run, count))
+
+    def get_results(self):
+        """
+        Returns the estimates of all points
+        """
+        results = []
+        for point in self.points:
+            result = point.get_result(self.options.confidence)
+            result["converged"] = self.is_precise(point)
+            results.append(result)
+        return results
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]",
+                          description="Runs replications of each parameter "
+                                      "point of a config file section with "
+                                      "new seeds, until the confidence "
+                                      "intervals of the chosen metrics are "
+                                      "narrow enough")
+    parser.add_option("-c", "--config", dest="config", default="config.json",
+                      action="store",
+                      help="simulation config file [default: %default]")
+    parser.add_option("-s", "--section", dest="section", default="simulation",
+                      action="store",
+                      help="section inside configuration file "
+                           "[default: %default]")
+    parser.add_option("-o", "--outdir", dest="outdir", default=".",
+                      action="store",
+                      help="output directory [default: %default]")
+    parser.add_option("-m", "--metrics", dest="metrics", default="dr,th",
+                      action="store",
+                      help="comma separated metrics to estimate, among dr, "
+                           "cr, th and sz [default: %default]")
+    parser.add_option("-p", "--precision", dest="precision", default=0.05,
+                      action="store", type="float",
+                      help="maximum half-width of the confidence interval "
+                           "relative to the mean [default: %default]")
+    parser.add_option("-C", "--confidence", dest="confidence", default=0.95,
+                      action="store", type="float",
+                      help="confidence level, 0.9, 0.95 or 0.99 "
+                           "[default: %default]")
+    parser.add_option("-n", "--min", dest="min", default=2, action="store",
+                      type="int",
+                      help="minimum number of replications per point "
+                           "[default: %default]")
+    parser.add_option("-N", "--max", dest="max", default=30, action="store",
+                      type="int",
+                      help="maximum number of replications per point "
+                           "[default: %default]")
+    parser.add_option("-j", "--jobs", dest="jobs",
+                      default=multiprocessing.cpu_count(), action="store",
+                      type="int",
+                      help="number of parallel processes [default: %default]")
+    parser.add_option("-r", "--results", dest="results",
+                      default="replications.json", action="store",
+                      help="file where estimates are saved, within the "
+                           "output directory [default: %default]")
+    (options, args) = parser.parse_args()
+
+    metrics = options.metrics.split(",")
+    for m in metrics:
+        if m not in ["dr", "cr", "th", "sz"]:
+            sys.stderr.write("Error: unknown metric %s\n" % m)
+            sys.exit(1)
+    if options.confidence not in T_QUANTILES:
+        sys.stderr.write("Error: confidence level must be one of %s\n" %
+                         sorted(T_QUANTILES.keys()))
+        sys.exit(1)
+    if options.min < 2 or options.max < options.min:
+        sys.stderr.write("Error: invalid number of replications\n")
+        sys.exit(1)
+
+    init_worker(options.config, options.section, options.outdir)
+    config = Config(options.config, options.section, options.outdir)
+    points = get_points(config, metrics)
+
+    # completed replications, put by the workers or directly by submit()
+    completed = Queue()
+    if options.jobs > 1:
+        pool = multiprocessing.Pool(options.jobs, init_worker,
+                                    (options.config, options.section,
+                                     options.outdir))
+
+        def submit(point, seed):
+            kwargs = {}
+            if sys.version_info[0] >= 3:
+                # errors in the pool itself, e.g., a result that cannot be
+                # sent back to this process
+                kwargs["error_callback"] = lambda e: completed.put(
+                    ReplicationFailure(point.run, seed, str(e)))
+            pool.apply_async(run_worker_replication, (point.run, seed),
+                             callback=completed.put, **kwargs)
+    else:
+        pool = None
+
+        def submit(point, seed):
+            completed.put(run_replication(point.run, seed))
+
+    controller = Controller(points, options, submit)
+    controller.start()
+    while controller.running > 0:
+        result = completed.get()
+        if isinstance(result, ReplicationFailure):
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            raise sim.SimulationError(str(result))
+        controller.handle_result(result)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    results_file = options.outdir + "/" + options.results
+    with open(results_file, "w") as f:
+        json.dump(controller.get_results(), f, indent=4, sort_keys=True)
+    print(results_file)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except sim.SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from optparse import OptionParser
+from timeit import default_timer
+import json
+import random
+import sys
+import sim
+from benchmark import measure_run, run_in_child
+from distribution import Distribution
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# samplers being compared
+SAMPLERS = [Distribution.PYTHON, Distribution.NUMPY]
+# random variables whose get_value() is timed, as in the default config file
+VARIABLES = [
+    ("exp(800)", {"distribution": "exp", "lambda": 800}),
+    ("unif(32, 1460) int", {"distribution": "unif", "min": 32, "max": 1460,
+                            "int": 1})
+]
+
+
+def create_distribution(config, sampler, seed):
+    """
+    Instantiates a random variable with the given sampler, drawing from a
+    PRNG of the same kind Sim gives to modules
+    """
+    if sampler == Distribution.NUMPY:
+        return Distribution(config, numpy.random.default_rng(seed), sampler)
+    return Distribution(config, random.Random(seed), sampler)
+
+
+def benchmark_get_value(config, sampler, values, repeat):
+    """
+    Times get_value() of a random variable. Values are drawn in batches of
+    many blocks, so that the numpy sampler pays for its refills
+    :param config: configuration of the random variable
+    :param sampler: the sampler
+    :param values: number of values drawn per measurement
+    :param repeat: number of measurements
+    :returns: the best time per value in nanoseconds
+    """
+    d = create_distribution(config, sampler, 0)
+    best = None
+    for i in range(repeat):
+        start = default_timer()
+        for j in range(values):
+            d.get_value()
+        elapsed = (default_timer() - start) / values
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e9
+
+
+def run_child(options):
+    """
+    Measures a run with the given sampler and prints the results as JSON
+    """
+    simulator = sim.Sim.Instance()
+    params = {
+        simulator.PAR_SAMPLER: options.sampler,
+        "interarrival": {"distribution": "exp", "lambda": options.load}
+    }
+    if options.duration > 0:
+        params[simulator.PAR_DURATION] = options.duration
+    print(json.dumps(measure_run(options.config, options.section, options.run,
+                                 params, options.repeat, options.min_time)))
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]",
+                          description="Compares the python and numpy "
+                                      "samplers, timing get_value() of the "
+                                      "random variables and a whole run")
+    parser.add_option("-c", "--config", dest="config", default="config.json",
+                      action="store",
+                      help="simulation config file [default: %default]")
+    parser.add_option("-s", "--section", dest="section", default="complete",
+                      action="store",
+                      help="section of the run being timed "
+                           "[default: %default]")
+    parser.add_option("-r", "--run", dest="run", default=0, action="store",
+                      type="int",
+                      help="run being timed, whose interarrival is replaced "
+                           "[default: %default]")
+    parser.add_option("-l", "--load", dest="load", default=800.0,
+                      action="store", type="float",
+                      help="lambda of the packet arrivals of the run "
+                           "[default: %default]")
+    parser.add_option("-d", "--duration", dest="duration", default=0.0,
+                      action="store", type="float",
+                      help="simulated seconds of the run, 0 to use the "
+                           "configured duration [default: %default]")
+    parser.add_option("-v", "--values", dest="values", default=200000,
+                      action="store", type="int",
+                      help="values drawn per get_value() measurement "
+                           "[default: %default]")
+    parser.add_option("-R", "--repeat", dest="repeat", default=5,
+                      action="store", type="int",
+                      help="measurements, the best of which is reported "
+                           "[default: %default]")
+    parser.add_option("-m", "--min-time", dest="min_time", default=0.1,
+                      action="store", type="float",
+                      help="minimum wall-clock seconds of a run measurement "
+                           "[default: %default]")
+    parser.add_option("-j", "--json", dest="json", default="",
+                      action="store", help="save results to a JSON file")
+    # options used internally to time a run in a child process
+    parser.add_option("--child", dest="child", default=False,
+                      action="store_true", help="internal use")
+    parser.add_option("--sampler", dest="sampler",
+                      default=Distribution.PYTHON, action="store",
+                      help="internal use")
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return
+    if numpy is None:
+        sys.stderr.write("Error: the numpy sampler requires numpy to be "
+                         "installed\n")
+        sys.exit(1)
+
+    results = []
+    for (name, config) in VARIABLES:
+        for sampler in SAMPLERS:
+            ns = benchmark_get_value(config, sampler, options.values,
+                                     options.repeat)
+            results.append({"benchmark": "get_value() %s" % name,
+                            "sampler": sampler, "ns": ns})
+            print("%-36s %-7s %8.0f ns" % ("get_value() " + name, sampler,
+                                           ns))
+    for sampler in SAMPLERS:
+        r = run_in_child(["-c", options.config, "-s", options.section,
+                          "-r", str(options.run), "-l", str(options.load),
+                          "-d", str(options.duration),
+                          "-R", str(options.repeat),
+                          "-m", str(options.min_time), "--sampler", sampler])
+        r.update({"benchmark": "%s run %d lambda=%s" %
+                  (options.section, options.run, options.load),
+                  "sampler": sampler})
+        results.append(r)
+        print("%-36s %-7s %8.3f s %9d events" % (r["benchmark"], sampler,
+                                                 r["time"], r["events"]))
+
+    if options.json != "":
+        with open(options.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except sim.SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+from optparse import OptionParser
+import json
+import random
+import sys
+import tempfile
+import time
+import sim
+from benchmark import measure_run, run_in_child
+from config import Config
+from channel import Channel
+from scheduler import Scheduler, create_scheduler
+
+# scheduler backends being compared
+BACKENDS = [Scheduler.HEAP, Scheduler.CALENDAR]
+# sections of the config file used as real scenarios
+SECTIONS = ["half", "complete"]
+# node counts of the synthetic topologies
+SYNTHETIC_NODES = [1000, 10000]
+
+
+def run_child(options):
+    """
+    Measures a run with the given scheduler and prints the number of handled
+    events and the time spent in the main loop as JSON
+    """
+    simulator = sim.Sim.Instance()
+    # override the scheduler and the duration of the run being benchmarked
+    params = {simulator.PAR_SCHEDULER: options.backend}
+    if options.duration > 0:
+        params[simulator.PAR_DURATION] = options.duration
+    r = measure_run(options.config, options.section, options.run, params,
+                    options.repeat, options.min_time)
+    print(json.dumps(r))
+
+
+def benchmark_scenario(options, section, run, backend):
+    """
+    Benchmarks a run of a config file section in a child process
+    :returns: the dictionary printed by run_child()
+    """
+    return run_in_child(["-c", options.config, "-s", section, "-r", str(run),
+                         "-b", backend, "-d", str(options.duration),
+                         "--repeat", str(options.repeat),
+                         "--min-time", str(options.min_time)])
+
+
+def scenario_runs(config_file, section):
+    """
+    Selects the runs of a section to benchmark: first seed, lowest and highest
+    load, and lowest and highest number of slots
+    :returns: list of (run number, description) pairs
+    """
+    config = Config(config_file, section, tempfile.gettempdir())
+    points = []
+    for run in range(config.get_runs_count()):
+        config.set_run_number(run)
+        points.append((run, config.get_param("seed"),
+                       config.get_param("interarrival")["lambda"],
+                       config.get_param("maxslots")))
+    first_seed = min(p[1] for p in points)
+    loads = [min(p[2] for p in points), max(p[2] for p in points)]
+    slots = [min(p[3] for p in points), max(p[3] for p in points)]
+    return [(p[0], "lambda=%s maxslots=%s" % (p[2], p[3])) for p in points
+            if p[1] == first_seed and p[2] in loads and p[3] in slots]
+
+
+def benchmark_synthetic(backend, nodes, degree, events, seed):
+    """
+    Hold model benchmark mimicking the events generated by a topology with the
+    given number of nodes. Each node keeps one packet arrival in the queue,
+    with an exponential inter-arrival time of mean 10 ms. Every arrival is
+    transmitted right away, scheduling a START_RX and an END_RX for each of its
+    neighbors, spaced by the propagation delay and the packet duration
+    :param backend: scheduler backend
+    :param nodes: number of nodes in the synthetic topology
+    :param degree: number of neighbors of each node
+    :param events: number of events to extract from the queue
+    :param seed: seed of the PRNG, so that all backends see the same events
+    :returns: dictionary with pushes, pops, time and a checksum of the order in
+    which events have been extracted
+    """
+    ARRIVAL = 0
+    RECEPTION = 1
+    rng = random.Random(seed)
+    queue = create_scheduler(backend)
+    max_delay = 50.0 / Channel.SOL
+    sequence = 0
+    for i in range(nodes):
+        queue.push([rng.expovariate(100), sequence, ARRIVAL])
+        sequence = sequence + 1
+    pushes = sequence
+    checksum = 0
+    start = time.time()
+    for i in range(events):
+        entry = queue.pop()
+        checksum = (checksum * 31 + entry[1]) % 1000000007
+        if entry[2] == ARRIVAL:
+            now = entry[0]
+            queue.push([now + rng.expovariate(100), sequence, ARRIVAL])
+            sequence = sequence + 1
+            duration = rng.uniform(32, 1460) * 8 / 8000000.0
+            for n in range(degree):
+                delay = rng.uniform(0, max_delay)
+                queue.push([now + delay, sequence, RECEPTION])
+                queue.push([now + delay + duration, sequence + 1, RECEPTION])
+                sequence = sequence + 2
+    elapsed = time.time() - start
+    return {"pushes": sequence - pushes, "pops": events, "time": elapsed,
+            "checksum": checksum}
+
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]",
+                          description="Compares the performance of the "
+                                      "scheduler backends on config file "
+                                      "scenarios and synthetic topologies")
+    parser.add_option("-c", "--config", dest="config", default="config.json",
+                      action="store",
+                      help="simulation config file [default: %default]")
+    parser.add_option("-d", "--duration", dest="duration", default=2.0,
+                      action="store", type="float",
+                      help="simulated seconds per scenario run, 0 to use the "
+                           "configured duration [default: %default]")
+    parser.add_option("-e", "--events", dest="events", default=200000,
+                      action="store", type="int",
+                      help="events extracted per synthetic benchmark "
+                           "[default: %default]")
+    parser.add_option("-n", "--degree", dest="degree", default=10,
+                      action="store", type="int",
+                      help="neighbors per node in synthetic topologies "
+                           "[default: %default]")
+    parser.add_option("--repeat", dest="repeat", default=1, action="store",
+                      type="int",
+                      help="measurements per scenario run, the best of which "
+                           "is reported [default: %default]")
+    parser.add_option("--min-time", dest="min_time", default=0.0,
+                      action="store", type="float",
+                      help="minimum wall-clock seconds of a measurement. "
+                           "shorter runs are executed several times "
+                           "[default: %default]")
+    parser.add_option("-j", "--json", dest="json", default="",
+                      action="store", help="save results to a JSON file")
+    # options used internally to benchmark a single run in a child process
+    parser.add_option("--child", dest="child", default=False,
+                      action="store_true", help="internal use")
+    parser.add_option("-s", "--section", dest="section", default="",
+                      action="store", help="internal use")
+    parser.add_option("-r", "--run", dest="run", default=0, action="store",
+                      type="int", help="internal use")
+    parser.add_option("-b", "--backend", dest="backend",
+                      default=Scheduler.HEAP, action="store",
+                      help="internal use")
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        run_child(options)
+        return
+
+    results = []
+    for section in SECTIONS:
+        for run, description in scenario_runs(options.config, section):
+            for backend in BACKENDS:
+                r = benchmark_scenario(options, section, run, backend)
+                r.update({"benchmark": "%s run %d (%s)" %
+                          (section, run, description), "backend": backend})
+                results.append(r)
+                print("%-48s %-9s %9d events %8.3f s %10.0f events/s" %
+                      (r["benchmark"], backend, r["events"], r["time"],
+                       r["events"] / r["time"]))
+
+    for nodes in SYNTHETIC_NODES:
+        checksums = set()
+        for backend in BACKENDS:
+            r = benchmark_synthetic(backend, nodes, options.degree,
+                                    options.events, 0)
+            checksums.add(r["checksum"])
+            r.update({"benchmark": "synthetic %d nodes" % nodes,
+                      "backend": backend})
+            results.append(r)
+            print("%-48s %-9s %9d ops    %8.3f s %10.0f ops/s" %
+                  (r["benchmark"], backend, r["pushes"] + r["pops"], r["time"],
+                   (r["pushes"] + r["pops"]) / r["time"]))
+        if len(checksums) != 1:
+            sys.stderr.write("Error: backends extracted events in different "
+                             "order for %d nodes\n" % nodes)
+            sys.exit(1)
+
+    if options.json != "":
+        with open(options.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except sim.SimulationError as e:
+        sys.stderr.write("%s\n" % str(e))
+        sys.exit(1)
@@ -0,0 +1,323 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import heapq
+import bisect
+from errors import SimulationError
+
+
+class Scheduler:
+    """
+    Defines the interface of the queue of events used by the simulator. The
+    queue stores entries in the form [time, sequence number, event] and returns
+    them ordered by time and, for equal times, by sequence number. Cancelled
+    entries have their event set to None and are never returned
+    """
+
+    # fraction of cancelled entries in the queue above which the queue is
+    # compacted
+    COMPACT_RATIO = 0.5
+
+    # scheduler backends that can be selected in the config file
+    HEAP = "heap"
+    CALENDAR = "calendar"
+
+    def push(self, entry):
+        """
+        Adds an entry to the queue
+        :param entry: the [time, sequence number, event] entry to add
+        """
+        raise NotImplementedError
+
+    def pop(self):
+        """
+        Removes and returns the first entry that has not been cancelled.
+        Raises IndexError if there are no entries left
+        :returns: the first entry in the queue
+        """
+        raise NotImplementedError
+
+    def peek(self):
+        """
+        Returns the first entry that has not been cancelled, without removing
+        it. Raises IndexError if there are no entries left
+        :returns: the first entry in the queue
+        """
+        raise NotImplementedError
+
+    def cancel(self, entry):
+        """
+        Marks an entry as cancelled, so that it will be skipped by pop()
+        :param entry: the entry to cancel
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        """
+        Returns the number of entries in the queue, including the cancelled
+        ones that have not been removed yet
+        """
+        raise NotImplementedError
+
+    def live(self):
+        """
+        Returns the number of entries in the queue that have not been
+        cancelled. Implementations count the cancelled entries still in the
+        queue in self.cancelled
+        """
+        return len(self) - self.cancelled
+
+
+def create_scheduler(name):
+    """
+    Instantiates a scheduler given its name in the config file
+    :param name: either Scheduler.HEAP or Scheduler.CALENDAR
+    :returns: the scheduler instance
+    """
+    if name == Scheduler.HEAP:
+        return HeapScheduler()
+    elif name == Scheduler.CALENDAR:
+        return CalendarScheduler()
+    raise SimulationError("Scheduler error: unknown scheduler %s" % name)
+
+
+class HeapScheduler(Scheduler):
+    """
+    Queue of events implemented as a binary heap. Cancelled entries are left in
+    the heap and the heap is rebuilt when they exceed COMPACT_RATIO of its size
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # the heap of entries
+        self.heap = []
+        # number of cancelled entries still in the heap
+        self.cancelled = 0
+
+    def push(self, entry):
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        entry = heapq.heappop(self.heap)
+        while entry[2] is None:
+            self.cancelled = self.cancelled - 1
+            entry = heapq.heappop(self.heap)
+        return entry
+
+    def peek(self):
+        while self.heap[0][2] is None:
+            self.cancelled = self.cancelled - 1
+            heapq.heappop(self.heap)
+        return self.heap[0]
+
+    def cancel(self, entry):
+        entry[2] = None
+        self.cancelled = self.cancelled + 1
+        if self.cancelled > self.COMPACT_RATIO * len(self.heap):
+            self.heap = [e for e in self.heap if e[2] is not None]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class CalendarScheduler(Scheduler):
+    """
+    Queue of events implemented as a calendar queue (R. Brown, "Calendar
+    queues: a fast O(1) priority queue implementation for the simulation event
+    set problem", Communications of the ACM, 1988). Entries are hashed by time
+    into an array of buckets (the days of a year), each one covering a time
+    interval of fixed width and holding a sorted list of entries. Dequeuing
+    scans the buckets in order, so push and pop are O(1) on average as long as
+    each bucket holds few entries. To keep it that way, the number of buckets
+    is doubled or halved as the queue grows or shrinks, and the bucket width
+    follows the observed spacing between dequeued events: the calendar is
+    rebuilt whenever the width drifts too far from it
+    """
+
+    # minimum number of buckets
+    MIN_BUCKETS = 2
+    # number of entries sampled to estimate the bucket width when no events
+    # have been dequeued yet
+    WIDTH_SAMPLES = 25
+    # bucket width as a multiple of the average spacing between events
+    WIDTH_FACTOR = 3
+    # the calendar is rebuilt when the width differs from the one suggested by
+    # the observed spacing by more than this factor
+    WIDTH_TOLERANCE = 2
+
+    def __init__(self, width=1.0):
+        """
+        Constructor
+        :param width: initial width of a bucket in seconds. it is only a
+        starting point, as the width adapts to the events being scheduled
+        """
+        # time interval covered by each bucket
+        self.width = width
+        # number of buckets, always a power of two
+        self.nbuckets = self.MIN_BUCKETS
+        self.buckets = [[] for i in range(self.nbuckets)]
+        # index of the current bucket, counted from time 0 without wrapping
+        # around the calendar. the first entry in the queue is never earlier
+        # than this bucket
+        self.current = 0
+        # time of the last entry returned by pop()
+        self.last_time = 0
+        # number of entries in the queue, including cancelled ones
+        self.size = 0
+        # number of cancelled entries still in the queue
+        self.cancelled = 0
+        # sum of the spacing between dequeued events and number of events
+        # considered in the sum
+        self.spacing = 0.0
+        self.dequeued = 0
+
+    def push(self, entry):
+        bucket = int(entry[0] / self.width) & (self.nbuckets - 1)
+        bisect.insort(self.buckets[bucket], entry)
+        self.size = self.size + 1
+        if self.size > 2 * self.nbuckets:
+            self.resize(2 * self.nbuckets)
+
+    def pop(self):
+        while True:
+            if self.size == 0:
+                raise IndexError("pop from empty calendar queue")
+            entry = self.pop_first()
+            self.size = self.size - 1
+            if entry[2] is not None:
+                break
+            self.cancelled = self.cancelled - 1
+        self.spacing = self.spacing + (entry[0] - self.last_time)
+        self.dequeued = self.dequeued + 1
+        self.last_time = entry[0]
+        if self.size < self.nbuckets // 2 and \
+           self.nbuckets > self.MIN_BUCKETS:
+            self.resize(self.nbuckets // 2)
+        elif self.dequeued >= self.nbuckets:
+            # check the width once every year worth of events
+            width = self.WIDTH_FACTOR * self.spacing / self.dequeued
+            if width > 0 and \
+               (self.width > width * self.WIDTH_TOLERANCE or
+                    width > self.width * self.WIDTH_TOLERANCE):
+                self.resize(self.nbuckets)
+            else:
+                self.spacing = 0.0
+                self.dequeued = 0
+        return entry
+
+    def peek(self):
+        while True:
+            if self.size == 0:
+                raise IndexError("peek from empty calendar queue")
+            (bucket, current) = self.find_first()
+            if bucket[0][2] is not None:
+                return bucket[0]
+            # drop the cancelled entry. the scan does not move forward, as
+            # entries earlier than the first one can still be pushed
+            bucket.pop(0)
+            self.size = self.size - 1
+            self.cancelled = self.cancelled - 1
+
+    def pop_first(self):
+        """
+        Removes and returns the first entry in the calendar, whether cancelled
+        or not. The calendar must not be empty
+        """
+        (bucket, current) = self.find_first()
+        self.current = current
+        return bucket.pop(0)
+
+    def find_first(self):
+        """
+        Finds the bucket holding the first entry in the calendar, whether
+        cancelled or not. The calendar must not be empty
+        :returns: the bucket and the index the scan has to continue from
+        """
+        width = self.width
+        mask = self.nbuckets - 1
+        buckets = self.buckets
+        current = self.current
+        end = current + self.nbuckets
+        # scan one year of buckets starting from the current one, looking for
+        # an entry that falls within the bucket in this year
+        while current < end:
+            bucket = buckets[current & mask]
+            if bucket and int(bucket[0][0] / width) <= current:
+                return (bucket, current)
+            current = current + 1
+        # the next entry is more than a year ahead. search directly for the
+        # bucket holding it and restart the scan from there
+        first = min(bucket[0] for bucket in buckets if bucket)
+        current = int(first[0] / width)
+        return (buckets[current & mask], current)
+
+    def cancel(self, entry):
+        entry[2] = None
+        self.cancelled = self.cancelled + 1
+        if self.cancelled > self.COMPACT_RATIO * self.size:
+            self.resize(self.nbuckets)
+
+    def resize(self, nbuckets):
+        """
+        Rebuilds the calendar with a different number of buckets, dropping
+        cancelled entries and recomputing the bucket width
+        :param nbuckets: the new number of buckets
+        """
+        entries = [e for bucket in self.buckets for e in bucket
+                   if e[2] is not None]
+        self.width = self.estimate_width(entries)
+        self.nbuckets = max(nbuckets, self.MIN_BUCKETS)
+        self.buckets = [[] for i in range(self.nbuckets)]
+        mask = self.nbuckets - 1
+        for e in entries:
+            self.buckets[int(e[0] / self.width) & mask].append(e)
+        for bucket in self.buckets:
+            bucket.sort()
+        self.current = int(self.last_time / self.width)
+        self.size = len(entries)
+        self.cancelled = 0
+        self.spacing = 0.0
+        self.dequeued = 0
+
+    def estimate_width(self, entries):
+        """
+        Estimates the bucket width as WIDTH_FACTOR times the average spacing
+        between dequeued events. Before any event has been dequeued, the
+        spacing is estimated from the earliest entries in the queue, ignoring
+        separations larger than twice the average, as suggested by Brown
+        :param entries: the entries in the queue
+        :returns: the new bucket width, or the current one if there are not
+        enough distinct times to compute it
+        """
+        if self.dequeued > 0 and self.spacing > 0:
+            return self.WIDTH_FACTOR * self.spacing / self.dequeued
+        times = sorted(e[0] for e in heapq.nsmallest(self.WIDTH_SAMPLES,
+                                                     entries))
+        gaps = [times[i + 1] - times[i] for i in range(len(times) - 1)]
+        if len(gaps) == 0:
+            return self.width
+        average = float(sum(gaps)) / len(gaps)
+        gaps = [g for g in gaps if g <= 2 * average]
+        average = float(sum(gaps)) / len(gaps)
+        if average <= 0:
+            return self.width
+        return self.WIDTH_FACTOR * average
+
+    def __len__(self):
+        return self.size
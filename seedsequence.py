@@ -0,0 +1,64 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import hashlib
+
+
+class SeedSequence:
+    """
+    Derives seeds for independent streams of random numbers from the seed of
+    a run. A sequence is identified by the root seed and by a spawn key, i.e.,
+    the path of child indices leading to it, and its seed is obtained by
+    hashing both with SHA-256. Different paths give unrelated seeds, so
+    streams can be added or removed without affecting the others. This
+    mirrors numpy.random.SeedSequence, which is used instead to seed numpy
+    Generators
+    """
+
+    # number of bytes of the hash used as seed
+    SEED_BYTES = 16
+
+    def __init__(self, entropy, spawn_key=()):
+        """
+        Constructor
+        :param entropy: the root seed, a non-negative integer
+        :param spawn_key: tuple of child indices identifying the sequence
+        """
+        self.entropy = entropy
+        self.spawn_key = tuple(spawn_key)
+
+    def child(self, index):
+        """
+        Returns the child sequence with the given index
+        :param index: a non-negative integer
+        """
+        return SeedSequence(self.entropy, self.spawn_key + (index,))
+
+    def spawn(self, count):
+        """
+        Returns the first count child sequences
+        :param count: number of children
+        """
+        return [self.child(i) for i in range(count)]
+
+    def get_seed(self):
+        """
+        Returns the seed of the sequence, an integer of SEED_BYTES bytes that
+        can be passed to random.Random
+        """
+        key = "%d:%s" % (self.entropy,
+                         ",".join(str(k) for k in self.spawn_key))
+        digest = hashlib.sha256(key.encode("ascii")).hexdigest()
+        return int(digest[:2 * self.SEED_BYTES], 16)
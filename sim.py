@@ -13,16 +13,32 @@
 #
 # Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
 
+import os
 import sys
-import heapq
 import random
 import time
+import traceback
 import math
+from timeit import default_timer
 from singleton import Singleton
+from errors import SimulationError
 from config import Config
 from channel import Channel
 from node import Node
-from log import Log
+from log import Log, create_log, get_log_file_name, get_summary_file_name, \
+    get_profile_file_name, get_checkpoint_file_name, strip_extension
+from scheduler import Scheduler, HeapScheduler, create_scheduler
+from event import Event
+from distribution import Distribution
+from seedsequence import SeedSequence
+from positions import PositionFile
+from profiler import Profiler
+from checkpoint import save_checkpoint, load_checkpoint
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # VT100 command for erasing content of the current prompt line
 ERASE_LINE = '\x1b[2K'
@@ -43,24 +59,88 @@ class Sim:
     PAR_SEED = "seed"
     # position of the nodes
     PAR_NODES = "nodes"
+    # scheduler backend implementing the queue of events
+    PAR_SCHEDULER = "scheduler"
+    # format of the output file, either "csv" or "binary"
+    PAR_LOG_FORMAT = "logformat"
+    # gzip compression of binary output files
+    PAR_LOG_COMPRESS = "logcompress"
+    # logging of the maximum length reached by each queue
+    PAR_LOG_HIGH_WATER = "loghighwater"
+    # computation of the metrics during the simulation
+    PAR_METRICS = "metrics"
+    # generation of random values, either "python" or "numpy"
+    PAR_SAMPLER = "sampler"
+    # random streams of the modules, either "shared" or "independent"
+    PAR_STREAMS = "streams"
+    SHARED = "shared"
+    INDEPENDENT = "independent"
+    # maximum number of processed events kept for recycling
+    POOL_SIZE = 1024
+    # interval between checkpoints in simulated and in wall-clock seconds
+    PAR_CHECKPOINT = "checkpoint"
+    PAR_CHECKPOINT_WALL = "checkpointwall"
+    # number of events processed between checks of the wall-clock time
+    CHECKPOINT_EVENTS = 10000
+    # attributes that are not part of the state of a run, and are not saved
+    # in checkpoints
+    NOT_CHECKPOINTED = ["config", "config_file", "section", "profile",
+                        "profiler", "end_hooks", "verbose"]
 
     def __init__(self):
         """
         Constructor initializing current time to 0 and the queue of events to
         empty
         """
+        self.reset()
+        # empty config file
+        self.config_file = ""
+        # empty section
+        self.section = ""
+        # runs are not profiled by default
+        self.profile = False
+        # nothing is printed by default, see set_verbose()
+        self.verbose = False
+        # functions called at the end of every run, see add_end_hook()
+        self.end_hooks = []
+
+    def reset(self):
+        """
+        Brings the simulator back to its initial state, discarding the nodes
+        and the events of the previous run, so that another run can be
+        executed within the same process. The configuration is kept
+        """
         # current simulation time
         self.time = 0
-        # queue of events, implemented as a heap
-        self.queue = []
+        # queue of events, by default implemented as a heap. each entry is a
+        # list [time, sequence number, event], where the sequence number breaks
+        # ties between events scheduled at the same time in FIFO order. the
+        # entry is also the handle returned to the module scheduling the event
+        self.queue = HeapScheduler()
+        # sequence number of the next scheduled event
+        self.sequence = 0
+        # sequence number of the event being processed. together with the
+        # current time, it tells which events have already been processed
+        self.event_sequence = -1
+        # number of events handled so far
+        self.handled_events = 0
+        # free list of processed events, recycled by new_event()
+        self.pool = []
         # list of nodes
         self.nodes = []
+        # ids assigned to the next module and to the next packet
+        self.modules_count = 0
+        self.packets_count = 0
+        # PRNG of the run, seeded by initialize()
+        self.random = random.Random()
+        # numpy Generators shared by all the streams of a module, by module id
+        self.generators = {}
+        # set to False to stop the simulation before its duration
+        self.running = True
+        # profiler of the run, if profiling is enabled
+        self.profiler = None
         # initialize() should be called before running the simulation
         self.initialized = False
-        # empty config file
-        self.config_file = ""
-        # empty section
-        self.section = ""
 
     def set_config(self, config_file, section, out_dir):
         """
@@ -73,15 +153,33 @@ class Sim:
         # instantiate config manager
         self.config = Config(self.config_file, self.section, out_dir)
 
+    def set_profile(self, profile):
+        """
+        Enables or disables the profiling of the runs. Profiled runs save a
+        report about the cost of events and transitions next to the output
+        file (see Profiler)
+        :param profile: True to profile the runs
+        """
+        self.profile = profile
+
+    def set_verbose(self, verbose):
+        """
+        Enables or disables the messages printed on the standard output, such
+        as the name of the output file at the end of each run. The command
+        line tools enable them, while programs driving the simulator get no
+        output by default
+        :param verbose: True to print the messages
+        """
+        self.verbose = verbose
+
     def get_runs_count(self):
         """
         Returns the number of runs for the given config file and section
         :returs: the total number of runs
         """
         if self.config_file == "" or self.section == "":
-            sys.stderr.write("Configuration error. Call set_config() before "
-                             "get_runs_count()\n")
-            sys.exit(1)
+            raise SimulationError("Configuration error. Call set_config() "
+                                  "before get_runs_count()")
         return self.config.get_runs_count()
 
     def initialize(self, run_number):
@@ -90,109 +188,616 @@ class Sim:
         :param run_number: the index of the simulation to be run
         """
         if self.config_file == "" or self.section == "":
-            sys.stderr.write("Configuration error. Call set_config() "
-                             "before initialize()\n")
-            sys.exit(1)
+            raise SimulationError("Configuration error. Call set_config() "
+                                  "before initialize()")
+        # start from a clean state, in case another run has been executed
+        self.reset()
         # set and check run number
         self.run_number = run_number
         if run_number >= self.config.get_runs_count():
-            sys.stderr.write("Simulation error. Run number %d does not exist. "
-                             "Please run the simulator with the --list option "
-                             "to list all possible runs\n" % run_number)
-            sys.exit(1)
+            raise SimulationError("Simulation error. Run number %d does not "
+                                  "exist. Please run the simulator with the "
+                                  "--list option to list all possible runs" %
+                                  run_number)
         self.config.set_run_number(run_number)
         # instantiate data logger
-        self.logger = Log(self.config.get_output_file())
+        self.log_format = self.config.get_param(self.PAR_LOG_FORMAT, Log.CSV)
+        self.log_compress = self.config.get_param(self.PAR_LOG_COMPRESS,
+                                                  False)
+        self.log_high_water = self.config.get_param(self.PAR_LOG_HIGH_WATER,
+                                                    False)
+        self.metrics = self.config.get_param(self.PAR_METRICS, False)
+        self.set_output_files(self.config.get_output_file())
+        self.logger = create_log(self.output_file, self.log_format,
+                                 self.log_compress, self.summary_file,
+                                 self.log_high_water)
         # get simulation duration
         self.duration = self.config.get_param(self.PAR_DURATION)
         # get seeds. each seed generates a simulation repetition
         self.seed = self.config.get_param(self.PAR_SEED)
-        random.seed(self.seed)
+        self.random.seed(self.seed)
+        self.sampler = self.config.get_param(self.PAR_SAMPLER,
+                                             Distribution.PYTHON)
+        if self.sampler not in [Distribution.PYTHON, Distribution.NUMPY]:
+            raise SimulationError("Configuration error: unknown sampler %s" %
+                                  self.sampler)
+        if self.sampler == Distribution.NUMPY and numpy is None:
+            raise SimulationError("Configuration error: the numpy sampler "
+                                  "requires numpy to be installed")
+        self.streams = self.config.get_param(self.PAR_STREAMS, self.SHARED)
+        if self.streams not in [self.SHARED, self.INDEPENDENT]:
+            raise SimulationError("Configuration error: unknown streams %s" %
+                                  self.streams)
+        # get checkpoint intervals. 0 disables checkpoints
+        self.checkpoint_interval = self.config.get_param(self.PAR_CHECKPOINT,
+                                                         0)
+        self.checkpoint_wall = self.config.get_param(self.PAR_CHECKPOINT_WALL,
+                                                     0)
+        if (self.checkpoint_interval > 0 or self.checkpoint_wall > 0) and \
+           self.log_compress and self.log_format == Log.BINARY:
+            raise SimulationError("Configuration error: checkpoints are not "
+                                  "supported with compressed logs")
+        if (self.checkpoint_interval > 0 or self.checkpoint_wall > 0) and \
+           self.profile:
+            # profiled runs use their own loop, which saves no checkpoints
+            raise SimulationError("Configuration error: checkpoints are not "
+                                  "supported in profiled runs. Set %s and %s "
+                                  "to 0 to profile the run" %
+                                  (self.PAR_CHECKPOINT,
+                                   self.PAR_CHECKPOINT_WALL))
+        self.next_checkpoint = self.checkpoint_interval
+        # instantiate the queue of events
+        self.queue = create_scheduler(
+            self.config.get_param(self.PAR_SCHEDULER, Scheduler.HEAP))
         # instantiate the channel
         self.channel = Channel(self.config)
         # instantiate all the nodes
         positions = self.config.get_param(self.PAR_NODES)
+        if not isinstance(positions, list):
+            # positions are stored in an external .npy file
+            positions = PositionFile(self.config.get_path(positions))
         for p in positions:
             x = p[0]
             y = p[1]
             node = Node(self.config, self.channel, x, y)
-            # let the channel know about this node
-            self.channel.register_node(node)
-            node.initialize()
             self.nodes.append(node)
+        # let the channel know about the nodes, computing all neighbors at once
+        self.channel.register_nodes(self.nodes)
+        for node in self.nodes:
+            node.initialize()
+        if self.profile:
+            self.profiler = Profiler()
+            for node in self.nodes:
+                self.profiler.instrument(node)
         # all done. simulation can start now
         self.initialized = True
 
+    def set_output_files(self, output_file):
+        """
+        Computes the names of all the files written by the run
+        :param output_file: output file name as configured, ending in .csv
+        """
+        self.output_file = get_log_file_name(output_file, self.log_format,
+                                             self.log_compress)
+        self.summary_file = None
+        if self.metrics:
+            self.summary_file = get_summary_file_name(output_file)
+        self.checkpoint_file = get_checkpoint_file_name(output_file)
+        self.profile_file = get_profile_file_name(output_file)
+
     def get_logger(self):
         """
         Returns the data logger to modules
         """
         return self.logger
 
+    def get_random(self):
+        """
+        Returns the PRNG of the run, to be used by modules instead of the
+        functions of the random module
+        """
+        return self.random
+
+    def get_sampler(self):
+        """
+        Returns the configured sampler, Distribution.PYTHON or
+        Distribution.NUMPY
+        """
+        return self.sampler
+
+    def get_stream(self, module_id, stream=0):
+        """
+        Returns the PRNG a module should draw the values of one of its random
+        variables from.
+        With shared streams and the python sampler, all modules share the
+        PRNG of the run. With the numpy sampler each module gets its own numpy
+        Generator, seeded by the seed of the run and by the module id, so that
+        values do not depend on how many values other modules draw in blocks.
+        With independent streams, each random variable of each module gets its
+        own PRNG, seeded from the seed sequence of the run with spawn key
+        (module id, stream). The values drawn by a variable are then the same
+        in runs that only differ in other variables, e.g., the traffic is the
+        same for any number of slots (common random numbers)
+        :param module_id: id of the module
+        :param stream: index of the random variable within the module
+        """
+        if self.streams == self.INDEPENDENT:
+            if self.sampler == Distribution.NUMPY:
+                sequence = numpy.random.SeedSequence(
+                    self.seed, spawn_key=(module_id, stream))
+                return numpy.random.default_rng(sequence)
+            return random.Random(SeedSequence(self.seed).child(module_id)
+                                 .child(stream).get_seed())
+        if self.sampler == Distribution.NUMPY:
+            if module_id not in self.generators:
+                self.generators[module_id] = \
+                    numpy.random.default_rng([self.seed, module_id])
+            return self.generators[module_id]
+        return self.random
+
+    def next_module_id(self):
+        """
+        Returns a new module id. Ids are unique within a run
+        """
+        module_id = self.modules_count
+        self.modules_count = self.modules_count + 1
+        return module_id
+
+    def next_packet_id(self):
+        """
+        Returns a new packet id. Ids are unique within a run
+        """
+        packet_id = self.packets_count
+        self.packets_count = self.packets_count + 1
+        return packet_id
+
     def get_time(self):
         """
         Returns current simulation time
         """
         return self.time
 
-    def schedule_event(self, event):
+    def get_event_key(self):
+        """
+        Returns the (time, sequence number) pair of the event being processed.
+        Events with a smaller pair have already been processed
+        """
+        return (self.time, self.event_sequence)
+
+    def new_event(self, event_time, event_type, destination, source,
+                  obj=None):
+        """
+        Returns an event with the given parameters, recycling one that has
+        already been processed if available. Parameters are the same as for
+        the Event constructor
+        """
+        if self.pool:
+            event = self.pool.pop()
+            event.recycle(event_time, event_type, destination, source, obj)
+            return event
+        return Event(event_time, event_type, destination, source, obj)
+
+    def release_event(self, event):
+        """
+        Gives back an event that has been processed, so that it can be
+        recycled by new_event(). Modules must not keep references to events
+        after handling them
+        :param event: the processed event
+        """
+        if len(self.pool) < self.POOL_SIZE:
+            # drop references to other objects so that they can be freed
+            event.recycle(0, 0, None, None)
+            self.pool.append(event)
+
+    def reserve_sequence(self, count):
+        """
+        Reserves a block of consecutive sequence numbers, to be passed to
+        schedule_event() by modules scheduling events on behalf of others
+        :param count: number of sequence numbers to reserve
+        :returns: the first sequence number of the block
+        """
+        first = self.sequence
+        self.sequence = self.sequence + count
+        return first
+
+    def schedule_event(self, event, sequence=None):
         """
         Adds a new event to the queue of events
         :param event: the event to schedule
+        :param sequence: sequence number obtained from reserve_sequence(). If
+        not specified, the next sequence number is assigned to the event
+        :returns: a handle that can be passed to cancel_event()
         """
         if event.get_time() < self.time:
-            sys.stderr.write("Schedule error: Module with id %d of type %s is "
-                             "trying to schedule an event in the past. Current"
-                             " time = %f, schedule time = %f",
-                             (event.get_source.get_id(),
-                              event.get_source.get_type(),
-                              self.time,
-                              event.get_time()))
-            sys.exit(1)
-        heapq.heappush(self.queue, (event.get_time(), event))
+            raise SimulationError("Schedule error: Module with id %d of type "
+                                  "%s is trying to schedule an event in the "
+                                  "past. Current time = %f, schedule time = "
+                                  "%f" % (event.get_source().get_id(),
+                                          event.get_source().get_type(),
+                                          self.time, event.get_time()))
+        if sequence is None:
+            sequence = self.sequence
+            self.sequence = self.sequence + 1
+        entry = [event.get_time(), sequence, event]
+        self.queue.push(entry)
+        return entry
 
     def next_event(self):
         """
-        Returns the first event in the queue
+        Returns the first event in the queue, skipping cancelled ones. Returns
+        None if the first entry in the queue produced no event to be delivered
         """
         try:
-            event = heapq.heappop(self.queue)
-            self.time = event[0]
-            return event[1]
+            entry = self.queue.pop()
         except IndexError:
-            print("No more events in the simulation queue. Terminating.")
-            sys.exit(0)
+            if self.verbose:
+                print("No more events in the simulation queue. Terminating.")
+            self.running = False
+            return None
+        self.time = entry[0]
+        self.event_sequence = entry[1]
+        event = entry[2]
+        if event.lazy:
+            # the entry stands for a series of events. get the first one and
+            # let the series put the entry back in the queue for the next one
+            return event.expand(entry)
+        # the event is gone from the queue, so the handle cannot cancel it
+        # anymore
+        entry[2] = None
+        return event
 
-    def cancel_event(self, event):
+    def cancel_event(self, handle):
         """
-        Deletes a scheduled event from the queue
-        :param event: the event to be canceled
+        Deletes a scheduled event from the queue. The entry is only marked as
+        cancelled and skipped by next_event()
+        :param handle: the handle returned by schedule_event()
         """
-        try:
-            self.queue.remove((event.get_time(), event))
-            heapq.heapify(self.queue)
-        except ValueError:
-            sys.stderr.write("Trying to delete an event that does not exist.\n")
-            sys.exit(1)
+        if handle[2] is None:
+            raise SimulationError("Trying to delete an event that does not "
+                                  "exist")
+        event = handle[2]
+        self.queue.cancel(handle)
+        self.release_event(event)
 
-    def run(self):
+    def run(self, replications=0, warmup=0, jobs=1):
         """
         Runs the simulation.
+        :param replications: if greater than 0, the run is simulated up to
+        the warm-up time and then forked into this number of replications,
+        see run_replications()
+        :param warmup: warm-up time in seconds, for replications
+        :param jobs: maximum number of replications running at once
+        """
+        self.check_initialized()
+        if replications > 0:
+            self.run_replications(replications, warmup, jobs)
+        else:
+            self.process_events()
+            self.finish()
+
+    def check_initialized(self):
+        """
+        Raises an error if the simulation cannot be run yet
         """
-        # first check that everything is ready
         if not self.initialized:
-            sys.stderr.write("Cannot run the simulation. "
-                             "Call initialize() first\n")
-            sys.exit(1)
+            raise SimulationError("Cannot run the simulation. "
+                                  "Call initialize() first")
+
+    def step(self, count=1):
+        """
+        Processes the next events, regardless of the configured duration.
+        Together with run_until() and events(), this lets other programs
+        drive the simulation. Call finish() at the end to write the results
+        :param count: number of events to process
+        :returns: the number of events processed, which is less than count if
+        the simulation ended
+        """
+        self.check_initialized()
+        processed = 0
+        while processed < count and self.running:
+            event = self.next_event()
+            if event is not None:
+                dst = event.get_destination()
+                dst.handle_event(event)
+                self.release_event(event)
+                processed = processed + 1
+        self.handled_events = self.handled_events + processed
+        return processed
+
+    def run_until(self, until):
+        """
+        Processes all the events up to the given time, regardless of the
+        configured duration. Later events stay in the queue, so the
+        simulation can be continued by other calls
+        :param until: time in seconds
+        :returns: the number of events processed
+        """
+        processed = 0
+        for event in self.events(until):
+            processed = processed + 1
+        return processed
+
+    def events(self, until=None):
+        """
+        Processes events one at a time, regardless of the configured
+        duration, yielding each of them once it has been handled. Events are
+        recycled when the generator is resumed or closed, so they must not be
+        kept
+        :param until: if given, processing stops before the first event later
+        than this time
+        :returns: a generator of the processed events
+        """
+        self.check_initialized()
+        while self.running:
+            if until is not None:
+                try:
+                    if self.queue.peek()[0] > until:
+                        return
+                except IndexError:
+                    # next_event() ends the simulation
+                    pass
+            event = self.next_event()
+            if event is not None:
+                dst = event.get_destination()
+                dst.handle_event(event)
+                self.handled_events = self.handled_events + 1
+                try:
+                    yield event
+                finally:
+                    # also recycle the event if the caller stops iterating
+                    self.release_event(event)
+
+    def stop(self):
+        """
+        Ends the simulation once the event being processed has been handled
+        """
+        self.running = False
 
-        # main simulation loop
-        while self.time <= self.duration:
-            # get next event and call the handle method of the destination
+    def add_end_hook(self, hook):
+        """
+        Registers a function called by finish() at the end of every run,
+        once the output files have been written. Hooks are kept across runs
+        :param hook: function taking the simulator as parameter
+        """
+        self.end_hooks.append(hook)
+
+    def process_events(self):
+        """
+        Processes events until the end of the simulation
+        """
+        if self.profiler is not None:
+            self.run_profiled()
+        elif self.checkpoint_interval > 0 or self.checkpoint_wall > 0:
+            self.run_checkpointed()
+        else:
+            # main simulation loop. handled events are counted locally, as
+            # this is the hottest loop of the simulator
+            handled = 0
+            while self.running and self.time <= self.duration:
+                # get next event and call the handle method of the destination
+                event = self.next_event()
+                if event is not None:
+                    dst = event.get_destination()
+                    dst.handle_event(event)
+                    self.release_event(event)
+                    handled = handled + 1
+            self.handled_events = self.handled_events + handled
+
+    def finish(self):
+        """
+        Writes the results of the run once the simulation is over
+        """
+        # report the maximum length reached by the queue of each node and
+        # the memory it uses
+        for node in self.nodes:
+            queue = node.get_queue()
+            self.logger.log_queue_high_water(node, queue.get_high_water(),
+                                             queue.get_memory())
+
+        self.logger.close()
+        if os.path.exists(self.checkpoint_file):
+            # the run is complete, so its checkpoint is not needed anymore
+            os.remove(self.checkpoint_file)
+        if self.profiler is not None:
+            self.profiler.save(self.profile_file)
+        if self.verbose:
+            print(self.output_file)
+        for hook in self.end_hooks:
+            hook(self)
+
+    def run_replications(self, count, warmup, jobs):
+        """
+        Simulates the run up to the warm-up time once, then forks child
+        processes continuing it as independent replications. Each child
+        reseeds the random streams (see start_replication()) and writes its
+        own output files, named after the configured one with _rep<index>
+        appended. Children share the memory of the warmed-up state copy on
+        write. The output files of the parent only contain the warm-up, so
+        they are named with _warmup appended, and analysis.py skips them
+        :param count: number of replications
+        :param warmup: warm-up time in seconds
+        :param jobs: maximum number of children running at once
+        """
+        if not hasattr(os, "fork"):
+            raise SimulationError("Simulation error: replications require "
+                                  "os.fork(), which is not available on this "
+                                  "platform")
+        self.set_output_files("%s_warmup.csv" %
+                              strip_extension(self.config.get_output_file()))
+        self.logger.rename(self.output_file, self.summary_file)
+        limit = min(warmup, self.duration)
+        while self.running and self.time <= limit:
             event = self.next_event()
-            dst = event.get_destination()
-            dst.handle_event(event)
+            if event is not None:
+                dst = event.get_destination()
+                dst.handle_event(event)
+                self.release_event(event)
+        # children must not write again what is still buffered
+        self.logger.sync()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        children = []
+        failed = 0
+        for k in range(count):
+            if len(children) == jobs:
+                failed = failed + self.wait_replication(children)
+            pid = os.fork()
+            if pid == 0:
+                self.run_replication(k)
+            children.append(pid)
+        while len(children) > 0:
+            failed = failed + self.wait_replication(children)
+        self.finish()
+        if failed > 0:
+            raise SimulationError("Simulation error: %d replications failed" %
+                                  failed)
+
+    def wait_replication(self, children):
+        """
+        Waits for a replication to terminate
+        :param children: list of process ids of the running replications. the
+        terminated one is removed
+        :returns: 1 if the replication failed, 0 otherwise
+        """
+        (pid, status) = os.wait()
+        children.remove(pid)
+        return 0 if status == 0 else 1
+
+    def run_replication(self, index):
+        """
+        Continues the run as a replication in a forked child process, which
+        exits at the end without returning
+        :param index: index of the replication
+        """
+        status = 0
+        try:
+            self.start_replication(index)
+            self.process_events()
+            self.finish()
+        except SimulationError as e:
+            sys.stderr.write("%s\n" % str(e))
+            status = 1
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # skip the cleanup of the parent process, e.g., atexit handlers
+        os._exit(status)
+
+    def start_replication(self, index):
+        """
+        Makes the current state the start of a replication: the random
+        streams are reseeded with a seed derived from the seed of the run and
+        the index, and logging restarts on new output files, discarding the
+        metrics of the warm-up
+        :param index: index of the replication
+        """
+        self.reseed(SeedSequence(self.seed).child(index).get_seed())
+        self.set_output_files("%s_rep%d.csv" % (
+            strip_extension(self.config.get_output_file()), index))
+        self.logger.restart(self.output_file, self.summary_file)
+        metrics = self.logger.metrics
+        if metrics is not None:
+            # queues are not empty at the end of the warm-up
+            for node in self.nodes:
+                metrics.queue_length(self.time, node.get_id(),
+                                     len(node.get_queue()))
+
+    def reseed(self, seed):
+        """
+        Reseeds all the random streams of the run, as if it had been
+        initialized with the given seed. Events already in the queue are not
+        affected
+        :param seed: the new seed
+        """
+        self.seed = seed
+        self.random.seed(seed)
+        self.generators = {}
+        for node in self.nodes:
+            node.create_distributions(self.config)
+
+    def run_checkpointed(self):
+        """
+        Main simulation loop saving checkpoints. Events are processed exactly
+        as in the loop in run(), but the loop stops when the time of the next
+        checkpoint is passed, or after CHECKPOINT_EVENTS events to check the
+        wall-clock time
+        """
+        last_checkpoint = default_timer()
+        while self.running and self.time <= self.duration:
+            limit = self.duration
+            if self.checkpoint_interval > 0:
+                limit = min(limit, self.next_checkpoint)
+            count = 0
+            while self.running and self.time <= limit and \
+                    count < self.CHECKPOINT_EVENTS:
+                event = self.next_event()
+                if event is not None:
+                    dst = event.get_destination()
+                    dst.handle_event(event)
+                    self.release_event(event)
+                    self.handled_events = self.handled_events + 1
+                count = count + 1
+            if self.checkpoint_interval > 0 and \
+               self.time > self.next_checkpoint:
+                while self.next_checkpoint < self.time:
+                    self.next_checkpoint = self.next_checkpoint + \
+                        self.checkpoint_interval
+                self.save_checkpoint()
+                last_checkpoint = default_timer()
+            elif self.checkpoint_wall > 0 and \
+                    default_timer() - last_checkpoint >= self.checkpoint_wall:
+                self.save_checkpoint()
+                last_checkpoint = default_timer()
+
+    def save_checkpoint(self):
+        """
+        Saves the state of the run to its checkpoint file, so that it can be
+        continued with resume()
+        """
+        run = {"config": self.config_file, "section": self.section,
+               "outdir": self.config.out_dir, "run": self.run_number}
+        state = dict((k, v) for (k, v) in self.__dict__.items()
+                     if k not in self.NOT_CHECKPOINTED)
+        save_checkpoint(self.checkpoint_file, self, run, state)
 
-        print(self.config.output_file)
+    def resume(self, checkpoint_file):
+        """
+        Restores the state of a run from a checkpoint. The run can then be
+        continued with run(), giving the same results as if it had not been
+        interrupted
+        :param checkpoint_file: name of the checkpoint file
+        """
+        self.reset()
+        (run, state) = load_checkpoint(checkpoint_file, self)
+        self.set_config(run["config"], run["section"], run["outdir"])
+        self.config.set_run_number(run["run"])
+        self.__dict__.update(state)
+
+    def run_profiled(self):
+        """
+        Main simulation loop measuring the cost of each event. It is kept
+        separate from the loop in run(), so that runs that are not profiled
+        do not pay for the measurements
+        """
+        profiler = self.profiler
+        timer = default_timer
+        start = timer()
+        while self.running and self.time <= self.duration:
+            event = self.next_event()
+            if event is not None:
+                # the event is recycled after handling, so get its type now
+                event_type = event.get_type()
+                handle_start = timer()
+                event.get_destination().handle_event(event)
+                profiler.event_handled(event_type, timer() - handle_start,
+                                       self.queue.live())
+                self.release_event(event)
+                self.handled_events = self.handled_events + 1
+        profiler.stop(timer() - start, self.time)
 
     def get_params(self, run_number):
         """
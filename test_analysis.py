@@ -0,0 +1,75 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import os
+import shutil
+import tempfile
+import unittest
+import analysis
+
+
+class FindOutputFilesTest(unittest.TestCase):
+    """
+    Checks that analysis.py selects exactly one output file per run
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def create(self, *names):
+        for name in names:
+            open(os.path.join(self.folder, name), "w").close()
+
+    def find(self):
+        return [os.path.basename(f)
+                for f in analysis.find_output_files(self.folder)]
+
+    def test_profile_report_excluded(self):
+        self.create("10_0_0_5.csv", "10_0_0_5.profile.json")
+        self.assertEqual(self.find(), ["10_0_0_5.csv"])
+
+    def test_replications_results_excluded(self):
+        self.create("10_0_0_5.json", "replications.json")
+        self.assertEqual(self.find(), ["10_0_0_5.json"])
+
+    def test_checkpoint_excluded(self):
+        self.create("10_0_0_5.bin", "10_0_0_5.ckpt", "20_0_0_5.ckpt.tmp")
+        self.assertEqual(self.find(), ["10_0_0_5.bin"])
+
+    def test_trace_preferred_to_summary(self):
+        self.create("10_0_0_5.csv", "10_0_0_5.json", "20_0_0_5.bin.gz",
+                    "20_0_0_5.json")
+        self.assertEqual(self.find(), ["10_0_0_5.csv", "20_0_0_5.bin.gz"])
+
+    def test_summary_only(self):
+        self.create("10_0_0_5.json", "20_0_0_5.json")
+        self.assertEqual(self.find(), ["10_0_0_5.json", "20_0_0_5.json"])
+
+    def test_warmup_excluded(self):
+        self.create("10_0_0_5_warmup.csv", "10_0_0_5_warmup.json",
+                    "10_0_0_5_rep0.csv", "10_0_0_5_rep1.csv")
+        self.assertEqual(self.find(), ["10_0_0_5_rep0.csv",
+                                       "10_0_0_5_rep1.csv"])
+
+    def test_results_of_analysis_excluded(self):
+        self.create("10_0_0_5.csv", "stats.csv", "res.csv")
+        self.assertEqual(self.find(), ["10_0_0_5.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
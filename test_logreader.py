@@ -0,0 +1,62 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import logreader
+from errors import SimulationError
+from log import BinaryLog
+
+
+class OpenLogTest(unittest.TestCase):
+    """
+    Checks that logreader.py recognizes binary log files by their header
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_binary_log(self):
+        file_name = os.path.join(self.folder, "10_0_0_5.bin")
+        with open(file_name, "wb") as f:
+            f.write(BinaryLog.MAGIC)
+        f = logreader.open_log(file_name)
+        f.close()
+
+    def test_compressed_binary_log(self):
+        file_name = os.path.join(self.folder, "10_0_0_5.bin.gz")
+        with gzip.open(file_name, "wb") as f:
+            f.write(BinaryLog.MAGIC)
+        f = logreader.open_log(file_name)
+        f.close()
+
+    def test_csv_log_rejected(self):
+        file_name = os.path.join(self.folder, "10_0_0_5.bin")
+        with open(file_name, "w") as f:
+            f.write("time,src,dst,event,size\n")
+        with self.assertRaises(SimulationError) as cm:
+            logreader.open_log(file_name)
+        self.assertEqual(str(cm.exception), "Log error: %s is not a binary "
+                                            "log file" % file_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
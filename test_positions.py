@@ -0,0 +1,88 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import positions
+from errors import SimulationError
+from positions import PositionFile
+
+
+class ReadHeaderTest(unittest.TestCase):
+    """
+    Checks that the header of .npy files is parsed without numpy, and that
+    corrupted headers are reported as configuration errors
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.folder, "nodes.npy")
+        # force the parsing of the header done without numpy
+        self.numpy = positions.numpy
+        positions.numpy = None
+
+    def tearDown(self):
+        positions.numpy = self.numpy
+        shutil.rmtree(self.folder)
+
+    def create(self, header, values=b""):
+        header = header.encode("latin1")
+        with open(self.file_name, "wb") as f:
+            f.write(PositionFile.MAGIC + b"\x01\x00" +
+                    struct.pack("<H", len(header)) + header + values)
+
+    def check_error(self):
+        with self.assertRaises(SimulationError) as cm:
+            PositionFile(self.file_name)
+        self.assertTrue(str(cm.exception).startswith(
+            "Configuration error: cannot load node positions from %s: " %
+            self.file_name))
+        return str(cm.exception)
+
+    def test_valid_header(self):
+        self.create("{'descr': '<f8', 'fortran_order': False, "
+                    "'shape': (2, 2), }",
+                    struct.pack("<4d", 1.0, 2.0, 3.0, 4.0))
+        self.assertEqual(list(PositionFile(self.file_name)),
+                         [(1.0, 2.0), (3.0, 4.0)])
+
+    def test_missing_key(self):
+        self.create("{'descr': '<f8', 'fortran_order': False, }")
+        self.assertTrue("'shape' is missing" in self.check_error())
+
+    def test_syntax_error(self):
+        self.create("{'descr': '<f8', 'fortran_order': False, 'shape': (2,")
+        self.check_error()
+
+    def test_header_not_a_dict(self):
+        self.create("(2, 2)")
+        self.check_error()
+
+    def test_truncated_header(self):
+        with open(self.file_name, "wb") as f:
+            f.write(PositionFile.MAGIC + b"\x01")
+        self.check_error()
+
+    def test_unsupported_type(self):
+        self.create("{'descr': '<c16', 'fortran_order': False, "
+                    "'shape': (2, 2), }")
+        self.assertTrue("unsupported type <c16" in self.check_error())
+
+
+if __name__ == "__main__":
+    unittest.main()
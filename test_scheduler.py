@@ -0,0 +1,51 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import unittest
+from scheduler import Scheduler, create_scheduler
+
+
+class LiveEntriesTest(unittest.TestCase):
+    """
+    Checks that cancelled entries are not counted as live by the schedulers
+    """
+
+    def check(self, name):
+        queue = create_scheduler(name)
+        entries = [[float(i), i, "event"] for i in range(10)]
+        for e in entries:
+            queue.push(e)
+        queue.cancel(entries[3])
+        queue.cancel(entries[7])
+        self.assertEqual(queue.live(), 8)
+        queue.pop()
+        self.assertEqual(queue.live(), 7)
+        # cancelling most of the entries compacts the queue
+        for e in entries[4:7] + entries[8:]:
+            queue.cancel(e)
+        self.assertEqual(queue.live(), 2)
+        self.assertTrue(len(queue) < 9)
+        self.assertEqual([queue.pop()[1], queue.pop()[1]], [1, 2])
+        self.assertEqual(queue.live(), 0)
+
+    def test_heap(self):
+        self.check(Scheduler.HEAP)
+
+    def test_calendar(self):
+        self.check(Scheduler.CALENDAR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright (C) 2016 Michele Segata <segata@ccs-labs.org>
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import sim
+from log import Log
+
+CONFIG = """{
+    "test" : {
+        "seed" : 0,
+        "duration" : 2,
+        "range" : 50,
+        "datarate" : 8000000,
+        "queue" : 0,
+        "interarrival" : {"distribution" : "exp", "lambda" : 800},
+        "size" : {"distribution" : "unif", "min" : 32, "max" : 1460,
+                  "int" : 1},
+        "processing" : {"distribution" : "const", "mean" : 0.000001},
+        "maxslots" : 0,
+        "nodes" : [[[12.0, 1.9], [15.4, 1.7], [15.1, 6.3], [17.3, 10.3]]],
+        "logformat" : "csv",
+        "loghighwater" : true,
+        "metrics" : true,
+        "output" : "out.csv"
+    }
+}
+"""
+
+
+class QueueHighWaterTest(unittest.TestCase):
+    """
+    Checks that the maximum length of the queues is logged at the end of a
+    run, both in the trace and in the metrics
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        # keep the cache of the parsed config file out of the user's cache
+        self.cache_home = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.folder, "cache")
+        config_file = os.path.join(self.folder, "config.json")
+        with open(config_file, "w") as f:
+            f.write(CONFIG)
+        self.sim = sim.Sim.Instance()
+        self.sim.reset()
+        self.sim.set_config(config_file, "test", self.folder)
+        self.sim.initialize(0)
+        self.sim.run()
+
+    def tearDown(self):
+        if self.cache_home is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.cache_home
+        shutil.rmtree(self.folder)
+
+    def expected(self):
+        return dict((str(node.get_id()), node.get_queue().get_high_water())
+                    for node in self.sim.nodes)
+
+    def test_high_water_in_trace(self):
+        high_water = {}
+        with open(os.path.join(self.folder, "out.csv")) as f:
+            for row in csv.DictReader(f):
+                if int(row["event"]) == Log.LOG_QUEUE_HIGH_WATER:
+                    high_water[row["src"]] = int(row["size"])
+        self.assertEqual(high_water, self.expected())
+        # packets are generated faster than they can be sent
+        self.assertTrue(max(high_water.values()) > 1)
+
+    def test_high_water_in_summary(self):
+        with open(os.path.join(self.folder, "out.json")) as f:
+            summary = json.load(f)
+        self.assertEqual(summary["high_water"], self.expected())
+        memory = dict((str(node.get_id()), node.get_queue().get_memory())
+                      for node in self.sim.nodes)
+        self.assertEqual(summary["queue_memory"], memory)
+        self.assertEqual(sorted(summary["delay"].keys()),
+                         sorted(memory.keys()))
+        self.assertTrue(all(d >= 0 for d in summary["delay"].values()))
+
+
+if __name__ == "__main__":
+    unittest.main()